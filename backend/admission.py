@@ -0,0 +1,175 @@
+# admission.py
+import math, time, threading, contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import metrics
+from sqlitedb import connect_sqlite
+
+# User the current pipeline runs for; read when scheduling upstream calls
+current_user = contextvars.ContextVar("current_user", default="anonymous")
+
+
+class Overloaded(Exception):
+    """Upstream capacity is exhausted; the caller should retry later"""
+
+    def __init__(self, retry_after, message="Server busy, try again shortly"):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+# -------------------------
+# Per-user token buckets
+# -------------------------
+RATE_LIMIT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    user_id TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class RateLimiter:
+    """Token bucket per user, shared by all workers through one SQLite file"""
+
+    def __init__(self, path, per_minute=20, burst=10):
+        self.path = path
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.local = threading.local()
+        self.connection().executescript(RATE_LIMIT_SCHEMA)
+
+    def connection(self):
+        # Autocommit mode so BEGIN IMMEDIATE below controls the transaction
+        return connect_sqlite(self.path, self.local, isolation_level=None)
+
+    def take(self, user_id, cost=1):
+        """Spend `cost` tokens; returns (allowed, seconds until enough tokens)"""
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (user_id, tokens, updated_at) VALUES (?, ?, ?)",
+                (user_id, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0 if allowed else (cost - tokens) / self.rate
+
+
+# -------------------------
+# Fair upstream scheduling
+# -------------------------
+class FairScheduler:
+    """Caps concurrent upstream calls and hands free slots out round-robin by user.
+
+    Each user's turn grants up to `weight` slots before moving to the next user,
+    so one busy user cannot starve the others. Callers wait at most `max_wait`
+    seconds, and new callers are refused outright once `max_waiting` are queued.
+
+    State is per process: under several gunicorn workers, give each one its
+    share of the deployment-wide cap rather than the whole of it.
+    """
+
+    def __init__(self, slots, max_waiting=32, max_wait=20, weights=None):
+        self.slots = slots
+        self.free = slots
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.weights = weights or {}
+        self.lock = threading.Lock()
+        self.queues = OrderedDict()
+        self.credits = {}
+        self.waiting = 0
+        self.avg_hold = 2.0
+
+    def load(self):
+        """Busy plus queued calls per slot"""
+        return (self.slots - self.free + self.waiting) / max(self.slots, 1)
+
+    def retry_after(self):
+        return (self.waiting / max(self.slots, 1) + 1) * self.avg_hold
+
+    @contextmanager
+    def slot(self, user_id=None, max_wait=None):
+        user_id = user_id or current_user.get()
+        start = time.monotonic()
+        self.acquire(user_id, max_wait)
+        metrics.observe("verifynow_upstream_wait_seconds", time.monotonic() - start, endpoint=metrics.current_endpoint.get())
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def try_acquire(self):
+        """Take a free slot without waiting; never jumps ahead of queued callers"""
+        with self.lock:
+            if self.free > 0 and not self.waiting:
+                self.free -= 1
+                return True
+            return False
+
+    def acquire(self, user_id, max_wait=None):
+        with self.lock:
+            if self.free > 0 and not self.waiting:
+                self.free -= 1
+                return
+            if self.waiting >= self.max_waiting:
+                raise Overloaded(self.retry_after())
+            waiter = threading.Event()
+            queue = self.queues.setdefault(user_id, deque())
+            queue.append(waiter)
+            self.waiting += 1
+
+        if waiter.wait(self.max_wait if max_wait is None else min(max_wait, self.max_wait)):
+            return
+        with self.lock:
+            if waiter.is_set():
+                # Granted between the timeout and taking the lock
+                return
+            queue.remove(waiter)
+            self.waiting -= 1
+            if not queue and self.queues.get(user_id) is queue:
+                del self.queues[user_id]
+                self.credits.pop(user_id, None)
+            raise Overloaded(self.retry_after())
+
+    def release(self, held_for=None):
+        with self.lock:
+            if held_for is not None:
+                self.avg_hold = 0.9 * self.avg_hold + 0.1 * held_for
+            waiter = self.next_waiter()
+            if waiter is None:
+                self.free += 1
+            else:
+                # Hand the slot straight to the next waiter
+                waiter.set()
+
+    def next_waiter(self):
+        if not self.queues:
+            return None
+        user_id, queue = next(iter(self.queues.items()))
+        weight = self.weights.get(user_id, 1)
+        credit = self.credits.get(user_id, weight) - 1
+        waiter = queue.popleft()
+        self.waiting -= 1
+        if not queue:
+            del self.queues[user_id]
+            self.credits.pop(user_id, None)
+        elif credit <= 0:
+            self.queues.move_to_end(user_id)
+            self.credits[user_id] = weight
+        else:
+            self.credits[user_id] = credit
+        return waiter
@@ -1,15 +1,33 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS, cross_origin
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import google.generativeai as genai
-from google.api_core import exceptions as ga_exceptions
-import os, jwt, json, datetime, re, time, traceback, tempfile, requests
+import os, sys, jwt, hmac, json, datetime, math, time, tempfile, logging, requests, threading, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 from jwt import ExpiredSignatureError, InvalidTokenError
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from history_store import get_history_store, GLOBAL_SCOPE
+from history_export import export_chunks, EXPORT_FORMATS
+from jobs import JobQueue, JobQueueFull
+from admission import RateLimiter, FairScheduler, Overloaded, current_user
+from quota import QuotaGovernor, QuotaExhausted, quota_key, retry_after_hint, retry_after_header, load_limits, DEFAULT_BACKOFF
+from routing import MODEL_TIERS, route_models, request_kind, latency_budget, parse_latency_budget
+from hedging import Hedger
+from deadline import DeadlineExceeded, current_deadline, start_deadline
+from pagefetch import PageFetcher, FetchError
+from domain_index import DomainIndex, KNOWN_SAFE, TRUSTED
+from image_meta import read_metadata, assess
+from lazy import LazyModule
+from google_certs import CachedCertsRequest
+from health import DependencyProbes, ProbeFailed
+import logs
+from responses import FastJSONProvider, compress_response, parse_fields, select_fields
+import metrics
+import profiling
+from verdicts import VERDICT_GENERATION_CONFIG, parse_verdict, normalize_verdict, repair_prompt, unparsed_verdict, timed_out_verdict
+from claims import extract_claims, normalize_claim, claim_key, ClaimCache
+from prompting import build_prompt, compact_text, estimate_tokens, truncate_to_budget, chunk_text, select_chunks, merge_verdicts
 
 # -------------------------
 # Load environment variables
@@ -32,11 +50,121 @@ for key, value in {
 # -------------------------
 # Configure APIs
 # -------------------------
-genai.configure(api_key=GEMINI_API_KEY)
+# GEMINI_API_ENDPOINT points the client at another host (e.g. the bench stubs)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+
+def configure_genai(module):
+    if GEMINI_API_ENDPOINT:
+        module.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        module.configure(api_key=GEMINI_API_KEY)
+
+
+# The Google SDKs dominate import time; they load on first use or during warm-up
+genai = LazyModule("google.generativeai", setup=configure_genai)
+ga_exceptions = LazyModule("google.api_core.exceptions")
+id_token = LazyModule("google.oauth2.id_token")
+google_requests = LazyModule("google.auth.transport.requests")
+
+# Google's ID-token signing certs (the default of id_token.verify_oauth2_token),
+# cached per process for their max-age over one pooled session
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+google_certs = CachedCertsRequest(lambda: google_requests.Request(session=requests.Session()))
+
+# Optional split of a submission into atomic claims, each cached on its own
+CLAIM_DECOMPOSITION = os.getenv("CLAIM_DECOMPOSITION", "false").lower() in ("1", "true", "yes")
+MAX_CLAIMS = int(os.getenv("MAX_CLAIMS", 8))
+
+# Boilerplate and duplicate-line stripping before prompting; off only to measure what it saves
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "true").lower() in ("1", "true", "yes")
+
+# Inputs above this many (estimated) tokens are split and verified in parallel
+TEXT_TOKEN_BUDGET = int(os.getenv("TEXT_TOKEN_BUDGET", 1500))
+MAX_TEXT_CHUNKS = int(os.getenv("MAX_TEXT_CHUNKS", 8))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", 4))
+
+SAFE_BROWSING_URL = os.getenv("SAFE_BROWSING_URL", "https://safebrowsing.googleapis.com/v4/threatMatches:find")
+
+# Per-user rate limit on verifications, shared by all workers
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", 20))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 10))
+
+# Concurrent Gemini calls for the whole deployment, queued fairly across users
+# beyond that; GEMINI_USER_WEIGHTS gives some users more turns, e.g. "user-a:3,user-b:2".
+# Each worker schedules only its own calls, so it gets an even share of the slots
+# (and of the queue) between the WEB_CONCURRENCY gunicorn workers, at least one each.
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", 8))
+GEMINI_MAX_WAITING = int(os.getenv("GEMINI_MAX_WAITING", 32))
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+GEMINI_WORKER_SLOTS = max(GEMINI_CONCURRENCY // WEB_CONCURRENCY, 1)
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", 20))
+GEMINI_USER_WEIGHTS = {
+    user_id.strip(): int(weight)
+    for user_id, _, weight in (item.partition(":") for item in os.getenv("GEMINI_USER_WEIGHTS", "").split(","))
+    if user_id.strip() and weight.strip().isdigit()
+}
+
+# Project-wide upstream limits, e.g.
+# {"gemini:gemini-2.5-pro-preview-03-25": {"rpm": 150, "tpm": 2000000}, "safebrowsing": {"rpm": 600}}
+UPSTREAM_QUOTAS = load_limits(os.getenv("UPSTREAM_QUOTAS"))
+QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", 5))
+
+# Race a second model against a primary slower than its running p90
+GEMINI_HEDGING = os.getenv("GEMINI_HEDGING", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.9))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", 0.1))
+
+# End-to-end budget per request (kept under the gunicorn worker timeout) and per job;
+# X-Latency-Budget-Ms can only shorten it. Stages get whatever is left, capped below.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 25))
+JOB_DEADLINE = float(os.getenv("JOB_DEADLINE", 120))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 60))
+GEMINI_MIN_SECONDS = float(os.getenv("GEMINI_MIN_SECONDS", 2))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", 15))
+SAFE_BROWSING_TIMEOUT = float(os.getenv("SAFE_BROWSING_TIMEOUT", 10))
+HISTORY_MIN_SECONDS = float(os.getenv("HISTORY_MIN_SECONDS", 1))
+
+# Link checks read the page itself, within these limits
+PAGE_FETCH = os.getenv("PAGE_FETCH", "true").lower() in ("1", "true", "yes")
+PAGE_FETCH_TIMEOUT = float(os.getenv("PAGE_FETCH_TIMEOUT", 6))
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", 2 * 1024 * 1024))
+
+# Background dependency probes behind /healthz and /readyz (intervals in seconds)
+PROBE_INTERVALS = {
+    "gemini": float(os.getenv("PROBE_INTERVAL_GEMINI", 60)),
+    "history": float(os.getenv("PROBE_INTERVAL_HISTORY", 30)),
+    "safe_browsing": float(os.getenv("PROBE_INTERVAL_SAFE_BROWSING", 300)),
+    "ocr": float(os.getenv("PROBE_INTERVAL_OCR", 600))
+}
+# Longest a /api/jobs/<id>/events stream stays open before the client reconnects
+JOB_EVENTS_TIMEOUT = float(os.getenv("JOB_EVENTS_TIMEOUT", 120))
+
+# Dependencies that must be up for /readyz to pass
+READY_REQUIRES = [name.strip() for name in os.getenv("READY_REQUIRES", "gemini,history").split(",") if name.strip()]
+
+# Responses of at least this many bytes are gzip/brotli encoded when the client accepts it
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+# JSON logs written by a background thread; only LOG_DEBUG_SAMPLE of DEBUG records are kept
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", 0.01))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_STREAM = sys.stderr if os.getenv("LOG_STREAM", "stdout").lower() == "stderr" else sys.stdout
+
+# Probes and scrapes would drown out real traffic at INFO
+QUIET_ENDPOINTS = {"healthz", "readyz", "prometheus_metrics"}
+
+logs.setup_logging(LOG_LEVEL, LOG_DEBUG_SAMPLE, LOG_QUEUE_SIZE, LOG_STREAM)
+log = logging.getLogger(__name__)
 
 
 
 app = Flask(__name__)
+# orjson-backed jsonify (stdlib json when orjson is not installed)
+app.json = FastJSONProvider(app)
 
 
 # -------------------------
@@ -48,6 +176,122 @@ CORS(app,
      supports_credentials=True,
      origins=["https://verify-now-ashy.vercel.app"])
 
+# -------------------------
+# Warm-up
+# -------------------------
+# With gunicorn preload_app the master runs warm_imports() before forking,
+# so workers share the loaded SDKs copy-on-write. Clients and connections
+# are per process: each worker builds them in a background thread, and
+# /readyz reports not ready until that finishes.
+warmup_done = threading.Event()
+warmup_lock = threading.Lock()
+warmup_pid = None
+
+
+def warm_imports():
+    for module in (genai, ga_exceptions, id_token, google_requests):
+        module.load()
+
+
+def warm_clients():
+    start = time.perf_counter()
+    try:
+        warm_imports()
+        google_certs.refresh(GOOGLE_OAUTH2_CERTS_URL)
+        get_history_store()
+        log.info("Warm-up finished", extra={"duration_ms": round((time.perf_counter() - start) * 1000)})
+    except Exception as e:
+        # Whatever failed here is retried lazily on first use
+        log.warning("Warm-up failed: %s", e)
+    finally:
+        warmup_done.set()
+        probes.start()
+
+
+def start_warmup():
+    """Warm this process up in the background; cheap to call on every request"""
+    global warmup_pid
+    if warmup_pid == os.getpid():
+        return
+    with warmup_lock:
+        if warmup_pid != os.getpid():
+            warmup_pid = os.getpid()
+            warmup_done.clear()
+            threading.Thread(target=warm_clients, name="warmup", daemon=True).start()
+
+
+@app.before_request
+def ensure_warmup():
+    # Covers `python app.py` and servers without the gunicorn post_fork hook
+    start_warmup()
+
+
+# -------------------------
+# Request Metrics
+# -------------------------
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.request_id = logs.new_request_id(request.headers.get("X-Request-Id"))
+    metrics.begin_request(request.endpoint)
+    # Gunicorn threads serve many requests; drop whatever the last one left set
+    current_user.set("anonymous")
+    request_kind.set("text")
+    budget = parse_latency_budget(request.headers.get("X-Latency-Budget-Ms"))
+    latency_budget.set(budget)
+    start_deadline(min(REQUEST_DEADLINE, budget) if budget else REQUEST_DEADLINE)
+
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get("request_started", time.perf_counter())
+    metrics.observe("verifynow_request_seconds", elapsed, endpoint=request.endpoint or "none", status=str(response.status_code))
+    response.headers["Server-Timing"] = metrics.server_timing_header(elapsed)
+    response.headers["X-Request-Id"] = g.get("request_id", "")
+    log.log(
+        logging.DEBUG if request.endpoint in QUIET_ENDPOINTS else logging.INFO,
+        "%s %s %d", request.method, request.path, response.status_code,
+        extra={
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 1),
+            "stages": metrics.stage_timings_ms()
+        }
+    )
+    return response
+
+
+# -------------------------
+# Response Compression
+# -------------------------
+# Registered after the metrics hook so it runs first and shows up in Server-Timing
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings, COMPRESS_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY)
+
+
+# -------------------------
+# On-demand Profiling
+# -------------------------
+@app.before_request
+def start_profiling():
+    # poll() reads the shared armed set at most every PROFILE_POLL_INTERVAL seconds
+    if profiling.poll():
+        g.profiling = profiling.begin(request.endpoint)
+
+
+@app.teardown_request
+def stop_profiling(exc):
+    token = g.pop("profiling", None)
+    if token:
+        profiling.end(token)
+
+
+@app.errorhandler(Overloaded)
+def upstream_overloaded(e):
+    metrics.inc("verifynow_admission_rejections_total", reason="overloaded")
+    return jsonify({"message": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+
 # -------------------------
 # Utility Functions
 # -------------------------
@@ -55,35 +299,135 @@ def verify_jwt(token):
     try:
         return jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
     except ExpiredSignatureError:
-        print("JWT Token expired")
+        log.debug("JWT expired")
     except InvalidTokenError:
-        print("Invalid JWT Token")
+        log.info("Invalid JWT")
     return None
 
 
-def call_gemini_working(prompt):
-    """Use the working Gemini models we found"""
-    working_models = [
-        "models/gemini-2.5-pro-preview-03-25",
-        "models/gemini-2.5-flash-preview-05-20",
-        "gemini-2.5-pro-preview-03-25", 
-        "gemini-2.5-flash-preview-05-20"
-    ]
+def compact(text):
+    """compact_text() unless PROMPT_COMPACTION is off"""
+    return compact_text(text) if PROMPT_COMPACTION else text.strip()
+
+
+def requested_fields():
+    """The ?fields= selection of this request (e.g. "verdict,summary,safety_check.safe"), or None"""
+    return parse_fields(request.args.get("fields"))
+
+
+def verify_admin(auth_header):
+    """Admin if the bearer is ADMIN_TOKEN or a JWT whose email is in ADMIN_EMAILS"""
+    if not auth_header.startswith("Bearer "):
+        return False
+    token = auth_header.split(" ")[1]
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if admin_token and hmac.compare_digest(token.encode(), admin_token.encode()):
+        return True
+    user = verify_jwt(token)
+    admin_emails = [e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()]
+    return bool(user and (user.get("email") or "").lower() in admin_emails)
+
+
+def enforce_rate_limit(user_id):
+    """429 response if the user is over their rate limit, else None"""
+    allowed, retry_after = rate_limiter.take(user_id)
+    if allowed:
+        return None
+    metrics.inc("verifynow_admission_rejections_total", reason="rate_limited")
+    return jsonify({"message": "Rate limit exceeded, try again shortly"}), 429, {"Retry-After": str(math.ceil(retry_after))}
+
+
+GEMINI_REPAIR_MODEL = "models/gemini-2.5-flash-preview-05-20"
+
+
+def gemini_generate(model_name, contents, generation_config=None, tokens=0):
+    """One Gemini call, paced by the shared quota and reporting 429s back to it"""
+    key = quota_key("gemini", model_name)
+    deadline = current_deadline.get()
+    deadline.timeout(minimum=GEMINI_MIN_SECONDS, stage="gemini")
+    quota.acquire(key, tokens, max_wait=min(QUOTA_MAX_WAIT, deadline.remaining() - GEMINI_MIN_SECONDS))
+    model = genai.GenerativeModel(model_name)
+    options = {"request_options": {"timeout": deadline.timeout(GEMINI_TIMEOUT, GEMINI_MIN_SECONDS, stage="gemini")}}
+    if generation_config:
+        options["generation_config"] = generation_config
+    try:
+        response = model.generate_content(contents, **options)
+    except ga_exceptions.ResourceExhausted as e:
+        quota.penalize(key, retry_after_hint(e))
+        metrics.inc("verifynow_upstream_throttled_total", upstream=key)
+        raise
+    usage = getattr(response, "usage_metadata", None)
+    quota.settle(key, tokens, getattr(usage, "total_token_count", None))
+    return response
+
+
+def call_gemini_working(prompt, generation_config=None, models=None, valid=None):
+    """Use the working Gemini models we found, routed to a tier unless models are given.
+
+    With GEMINI_HEDGING on, routed calls may race the other tier; `valid`
+    decides whether an answer is good enough to win.
+    """
+    tokens = estimate_tokens(prompt)
+    working_models = models or route_models(tokens, gemini_scheduler.load())
     
+    # One fair-queue slot covers the whole fallback chain
+    max_wait = current_deadline.get().timeout(GEMINI_MAX_WAIT, GEMINI_MIN_SECONDS, stage="gemini")
+    with gemini_scheduler.slot(max_wait=max_wait), metrics.timed("gemini"):
+        if GEMINI_HEDGING and not models:
+            return hedged_gemini(prompt, generation_config, working_models, tokens, valid)
+        return try_gemini_models(prompt, generation_config, working_models, tokens)
+
+
+def try_gemini_models(prompt, generation_config, working_models, tokens, cancelled=None):
     for model_name in working_models:
+        if cancelled is not None and cancelled.is_set():
+            break
+        start = time.perf_counter()
         try:
-            print(f"Trying Gemini model: {model_name}")
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
+            log.debug("Trying Gemini model %s", model_name)
+            response = gemini_generate(model_name, prompt, generation_config, tokens)
+            elapsed = time.perf_counter() - start
             if response.text:
+                metrics.observe("verifynow_gemini_seconds", elapsed, model=model_name, outcome="ok")
+                hedger.record(quota_key("gemini", model_name), elapsed)
                 return response.text
+            metrics.observe("verifynow_gemini_seconds", elapsed, model=model_name, outcome="empty")
+        except QuotaExhausted as e:
+            # Out of quota here: move on without spending a call
+            log.info("Skipping %s: %s", model_name, e)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"Model {model_name} failed: {e}")
-            continue
+            metrics.observe("verifynow_gemini_seconds", time.perf_counter() - start, model=model_name, outcome="error")
+            log.warning("Model %s failed: %s", model_name, e)
+        metrics.inc("verifynow_gemini_fallbacks_total", model=model_name)
     
     raise Exception("No working Gemini models found")
 
 
+def hedged_gemini(prompt, generation_config, working_models, tokens, valid):
+    """Primary chain, plus the first model of another tier if the primary is slow"""
+    primary = quota_key("gemini", working_models[0])
+    alternate = next((m for m in working_models if quota_key("gemini", m) != primary), None)
+    # Separate context copies: one context cannot be entered by two threads at once
+    primary_ctx, alternate_ctx = contextvars.copy_context(), contextvars.copy_context()
+
+    def run_alternate(cancelled):
+        # The hedge is a second concurrent call, so it holds a slot of its own (taken by admit)
+        try:
+            return alternate_ctx.run(try_gemini_models, prompt, generation_config, [alternate], tokens, cancelled)
+        finally:
+            gemini_scheduler.release()
+
+    return hedger.run(
+        lambda cancelled: primary_ctx.run(try_gemini_models, prompt, generation_config, working_models, tokens, cancelled),
+        alternate and run_alternate,
+        hedger.delay(primary),
+        valid,
+        admit=gemini_scheduler.try_acquire
+    )
+
+
 def check_url_safety(url):
     """Check if a URL is safe using Google Safe Browsing API"""
     api_key = os.getenv("GOOGLE_SAFE_BROWSING_API_KEY")
@@ -91,7 +435,7 @@ def check_url_safety(url):
         return {"error": "Safe Browsing API key not configured"}
     
     # Google Safe Browsing API endpoint
-    api_url = "https://safebrowsing.googleapis.com/v4/threatMatches:find"
+    api_url = SAFE_BROWSING_URL
     
     # Request payload
     payload = {
@@ -108,12 +452,22 @@ def check_url_safety(url):
     }
     
     try:
-        response = requests.post(
-            f"{api_url}?key={api_key}",
-            json=payload,
-            timeout=10
-        )
+        deadline = current_deadline.get()
+        quota.acquire("safebrowsing", max_wait=min(QUOTA_MAX_WAIT, deadline.remaining() - 1))
+        with metrics.timed("safe_browsing"):
+            # Key in a header, not the URL, so it never shows up in exception messages
+            response = requests.post(
+                api_url,
+                json=payload,
+                headers={"X-Goog-Api-Key": api_key},
+                timeout=deadline.timeout(SAFE_BROWSING_TIMEOUT, stage="safe_browsing")
+            )
         
+        if response.status_code == 429:
+            retry_after = retry_after_header(response.headers.get("Retry-After"))
+            quota.penalize("safebrowsing", DEFAULT_BACKOFF if retry_after is None else retry_after)
+            metrics.inc("verifynow_upstream_throttled_total", upstream="safebrowsing")
+
         if response.status_code == 200:
             result = response.json()
             
@@ -148,8 +502,9 @@ def check_url_safety(url):
             }
             
     except Exception as e:
+        log.warning("Safe Browsing check failed: %s", e)
         return {
-            "error": f"Safe Browsing check failed: {str(e)}"
+            "error": f"Safe Browsing check failed: {type(e).__name__}"
         }
 
 
@@ -169,23 +524,24 @@ def extract_text_from_image(image_path):
                 image = image.convert('RGB')
             
             # Use pytesseract to extract text
-            text = pytesseract.image_to_string(image)
+            with metrics.timed("ocr"):
+                text = pytesseract.image_to_string(image, timeout=current_deadline.get().timeout(OCR_TIMEOUT, stage="ocr"))
             
             if text.strip():
-                print(f"OCR extracted text: {text.strip()}")
+                log.debug("OCR extracted text", extra={"ocr_text": text.strip()})
                 return text.strip()
                 
         except ImportError:
-            print("pytesseract not installed")
+            log.warning("pytesseract not installed")
         except Exception as e:
-            print(f"OCR failed: {e}")
+            log.warning("OCR failed: %s", e)
         
         # Fallback: Try to describe the image using Gemini Vision
         try:
-            print("Trying Gemini Vision as fallback...")
+            log.debug("Trying Gemini Vision as fallback")
             return describe_image_with_gemini(image_path)
         except Exception as e:
-            print(f"Gemini Vision fallback failed: {e}")
+            log.warning("Gemini Vision fallback failed: %s", e)
         
         return "Unable to extract text from image. Please describe the image content manually."
         
@@ -196,9 +552,6 @@ def extract_text_from_image(image_path):
 def describe_image_with_gemini(image_path):
     """Use Gemini to describe the image content"""
     try:
-        # Use a model that supports vision
-        model = genai.GenerativeModel("models/gemini-2.5-flash-preview-05-20")
-        
         # Read the image file
         with open(image_path, "rb") as f:
             image_data = f.read()
@@ -211,7 +564,10 @@ def describe_image_with_gemini(image_path):
         
         prompt = "Describe this image in detail. Focus on any text, objects, people, or context that could be fact-checked. Be specific about what you see."
         
-        response = model.generate_content([prompt, image_part])
+        # Images cost a fixed 258 tokens on top of the prompt
+        max_wait = current_deadline.get().timeout(GEMINI_MAX_WAIT, GEMINI_MIN_SECONDS, stage="vision")
+        with gemini_scheduler.slot(max_wait=max_wait), metrics.timed("vision"):
+            response = gemini_generate("models/gemini-2.5-flash-preview-05-20", [prompt, image_part], tokens=estimate_tokens(prompt) + 258)
         return response.text if hasattr(response, 'text') else "No description generated"
         
     except Exception as e:
@@ -219,30 +575,493 @@ def describe_image_with_gemini(image_path):
 
 
 def save_temp_uploaded_file(file_storage):
-    filename = secure_filename(file_storage.filename or "upload")
-    tmp = tempfile.NamedTemporaryFile(prefix="verify_", suffix=os.path.splitext(filename)[1], delete=False)
-    file_storage.save(tmp.name)
-    tmp.close()
-    return tmp.name
+    with metrics.timed("upload"):
+        filename = secure_filename(file_storage.filename or "upload")
+        tmp = tempfile.NamedTemporaryFile(prefix="verify_", suffix=os.path.splitext(filename)[1], delete=False)
+        file_storage.save(tmp.name)
+        tmp.close()
+        return tmp.name
+
+
+def gemini_verdict(prompt, **defaults):
+    """Ask Gemini for a schema-constrained verdict and normalize it.
+
+    Output that still fails to parse gets one repair pass on the cheap model
+    rather than a full re-verification.
+    """
+    raw = call_gemini_working(
+        prompt, generation_config=VERDICT_GENERATION_CONFIG,
+        valid=lambda text: parse_verdict(text) is not None
+    )
+    parsed = parse_verdict(raw)
+    if parsed is None:
+        metrics.inc("verifynow_json_parse_failures_total")
+        try:
+            parsed = parse_verdict(call_gemini_working(repair_prompt(raw), VERDICT_GENERATION_CONFIG, [GEMINI_REPAIR_MODEL]))
+        except Exception as e:
+            log.warning("JSON repair failed: %s", e)
+        metrics.inc("verifynow_json_repairs_total", outcome="ok" if parsed else "failed")
+    return normalize_verdict(parsed if parsed is not None else unparsed_verdict(raw), **defaults)
 
 
-def extract_json(text):
-    """Extract JSON from text response"""
+# -------------------------
+# Verification Pipelines
+# -------------------------
+# Each pipeline takes already-validated input and returns (payload, status),
+# so the same logic serves the synchronous routes and background jobs.
+def run_text_verification(user_id, text, decompose=None):
+    current_user.set(user_id)
+    request_kind.set("text")
     try:
-        # Try to find JSON in the response
-        match = re.search(r"```json\s*(\{.*\})\s*```|(\{.*\})", text, re.DOTALL)
-        json_text = match.group(1) or match.group(2) if match else text
+        content = compact(text)
+        if decompose is None:
+            decompose = CLAIM_DECOMPOSITION
+        claims = extract_claims(content, MAX_CLAIMS) if decompose else []
+
+        if len(claims) > 1:
+            parsed = verify_claims(claims)
+        elif claims and estimate_tokens(content) <= TEXT_TOKEN_BUDGET:
+            parsed = verify_single_claim(content, claims[0])
+        elif estimate_tokens(content) <= TEXT_TOKEN_BUDGET:
+            # Single API call - no intermediate steps
+            parsed = gemini_verdict(build_prompt("Statement", content))
+        else:
+            # Already in the verdict contract; renormalizing would turn a merged 0 into the default 75
+            parsed = verify_long_text(content)
+
+        # Save to history (this happens after response is ready)
+        history_data = {
+            "type": "text",
+            "content": text[:200],
+            "verdict": parsed["verdict"],
+            "summary": parsed["summary"],
+            "proofs": parsed["proofs"],
+            "confidence": parsed["confidence"]
+        }
+        save_verification_history(user_id, history_data)
         
-        # Parse JSON
-        parsed = json.loads(json_text)
-        return parsed
-    except Exception:
-        # If no valid JSON, create a basic response
+        return parsed, 200
+
+    except DeadlineExceeded as e:
+        log.warning("Text verification timed out: %s", e)
+        return timed_out_verdict("Verification ran out of time before the model answered"), 504
+    except Overloaded:
+        raise
+    except Exception as e:
+        log.exception("Text verification failed")
+        # Return complete error response immediately
         return {
-            "verdict": "Unverified",
-            "summary": text[:300] + "..." if len(text) > 300 else text,
-            "proofs": ["Analysis completed"]
+            "verdict": "Unverified", 
+            "summary": f"Verification failed: {str(e)}",
+            "proofs": ["Technical error during analysis"],
+            "confidence": 0
+        }, 500
+
+
+def verify_single_claim(content, claim):
+    """Verify a one-claim text in a single call, sharing the claim cache with verify_claims.
+
+    The cache is only used when the text is the claim itself: a verdict on a
+    longer text must not be served later as the verdict on its claim alone.
+    """
+    if normalize_claim(content) != normalize_claim(claim):
+        return gemini_verdict(build_prompt("Statement", content))
+
+    key = claim_key(claim)
+    with metrics.timed("claim_cache"):
+        cached = claim_cache.get_many([key])
+    metrics.inc("verifynow_cache_hits_total", len(cached), cache="claim")
+    metrics.inc("verifynow_cache_misses_total", 1 - len(cached), cache="claim")
+    if key in cached:
+        return normalize_verdict(cached[key])
+
+    result = gemini_verdict(build_prompt("Statement", content))
+    if result.get("verdict") in ("Real", "Fake", "Misleading"):
+        claim_cache.put(key, claim, result)
+    return result
+
+
+def verify_claims(claims):
+    """Verify atomic claims, reusing cached verdicts and checking only the misses"""
+    keys = [claim_key(claim) for claim in claims]
+    with metrics.timed("claim_cache"):
+        cached = claim_cache.get_many(keys)
+    metrics.inc("verifynow_cache_hits_total", len(cached), cache="claim")
+    metrics.inc("verifynow_cache_misses_total", len(claims) - len(cached), cache="claim")
+
+    def verify_claim(claim, key):
+        try:
+            result = gemini_verdict(build_prompt("Claim", claim))
+        except Overloaded:
+            raise
+        except DeadlineExceeded:
+            return {"verdict": "Unverified", "confidence": 0, "proofs": [], "timed_out": True}
+        except Exception as e:
+            log.warning("Claim verification failed: %s", e)
+            return {"verdict": "Unverified", "confidence": 0, "proofs": []}
+        if result.get("verdict") in ("Real", "Fake", "Misleading"):
+            claim_cache.put(key, claim, result)
+        return result
+
+    misses = [(claim, key) for claim, key in zip(claims, keys) if key not in cached]
+    fresh = {}
+    if misses:
+        with metrics.timed("claim_verify"):
+            with ThreadPoolExecutor(max_workers=min(CHUNK_CONCURRENCY, len(misses))) as pool:
+                futures = {key: pool.submit(contextvars.copy_context().run, verify_claim, claim, key) for claim, key in misses}
+                fresh = {key: future.result() for key, future in futures.items()}
+
+    results = [cached.get(key) or fresh[key] for key in keys]
+    merged = merge_verdicts(results, unit="claims")
+    merged.pop("sections")
+    merged["claims"] = [
+        {
+            "claim": claim,
+            "verdict": result.get("verdict", "Unverified"),
+            "confidence": result.get("confidence", 0),
+            "summary": result.get("summary", ""),
+            "proofs": result.get("proofs", []),
+            "cached": key in cached
         }
+        for claim, key, result in zip(claims, keys, results)
+    ]
+    if any(result.get("timed_out") for result in results):
+        merged["partial"] = True
+    return merged
+
+
+def verify_long_text(content):
+    """Map-reduce a long text: verify its sections in parallel, then merge"""
+    chunks = select_chunks(chunk_text(content, TEXT_TOKEN_BUDGET), MAX_TEXT_CHUNKS)
+
+    def verify_chunk(index, chunk):
+        context = f"This is section {index + 1} of {len(chunks)} of a longer text. Judge only the claims in this section.\n"
+        try:
+            return gemini_verdict(build_prompt("Statement", chunk, context=context))
+        except Overloaded:
+            raise
+        except DeadlineExceeded:
+            return {"verdict": "Unverified", "confidence": 0, "proofs": [], "timed_out": True}
+        except Exception as e:
+            log.warning("Section %d failed: %s", index + 1, e)
+            return {"verdict": "Unverified", "confidence": 0, "proofs": []}
+
+    with metrics.timed("chunked_verify"):
+        with ThreadPoolExecutor(max_workers=min(CHUNK_CONCURRENCY, len(chunks))) as pool:
+            # Each task gets its own context copy so stage metrics keep the endpoint label
+            futures = [pool.submit(contextvars.copy_context().run, verify_chunk, i, c) for i, c in enumerate(chunks)]
+            results = [future.result() for future in futures]
+    merged = merge_verdicts(results)
+    if any(result.get("timed_out") for result in results):
+        merged["partial"] = True
+    return merged
+
+
+def run_image_verification(user_id, local_path):
+    """Verify a saved upload; the temp file is always removed afterwards"""
+    current_user.set(user_id)
+    request_kind.set("image")
+    try:
+        # Header-only provenance first; conclusive metadata skips OCR and the model
+        with metrics.timed("image_metadata"):
+            metadata = read_metadata(local_path)
+        finding, hints = assess(metadata)
+        metrics.inc("verifynow_image_provenance_total", outcome="conclusive" if finding else "hints" if hints else "none")
+        if finding:
+            result = {**finding, "image_metadata": metadata}
+            save_verification_history(user_id, {"type": "image", "content": "; ".join(hints), **finding})
+            return result, 200
+
+        # Extract text/description (single step)
+        image_description = extract_text_from_image(local_path)
+
+        # Analyze with Gemini (single step)
+        description = truncate_to_budget(compact(image_description), TEXT_TOKEN_BUDGET)
+        context = "Image Metadata: " + "; ".join(hints) + "\n" if hints else ""
+        try:
+            parsed_result = gemini_verdict(
+                build_prompt("Image Description", description, context=context),
+                summary="Image analysis completed", proofs=["Visual content analyzed"]
+            )
+        except DeadlineExceeded as e:
+            # The extracted content is still worth returning
+            log.warning("Image verification timed out: %s", e)
+            parsed_result = timed_out_verdict("Fact-check ran out of time; the extracted image content is attached")
+            parsed_result["image_analysis"] = image_description[:500]
+            if metadata:
+                parsed_result["image_metadata"] = metadata
+            return parsed_result, 200
+
+        # Add context
+        parsed_result["image_analysis"] = image_description[:500]
+        if metadata:
+            parsed_result["image_metadata"] = metadata
+
+        # Save history
+        history_data = {
+            "type": "image",
+            "content": image_description,
+            "verdict": parsed_result["verdict"],
+            "summary": parsed_result["summary"],
+            "proofs": parsed_result["proofs"],
+            "confidence": parsed_result["confidence"]
+        }
+        save_verification_history(user_id, history_data)
+
+        return parsed_result, 200
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        return {
+            "verdict": "Unverified", 
+            "summary": f"Image verification failed: {str(e)}",
+            "proofs": ["Technical error during processing"],
+            "confidence": 0
+        }, 500
+
+    finally:
+        # Clean up
+        if local_path and os.path.exists(local_path):
+            os.remove(local_path)
+
+
+def run_link_verification(user_id, url):
+    current_user.set(user_id)
+    request_kind.set("link")
+    try:
+        # Known domains can skip Safe Browsing, and sometimes everything else
+        reputation = domain_index.lookup(url)
+        instant = reputation_verdict(url, reputation)
+        if instant:
+            save_verification_history(user_id, {"type": "link", "content": url, **instant})
+            return instant, 200
+
+        # Single safety check
+        if reputation and reputation["category"] in KNOWN_SAFE:
+            safety_result = {
+                "safe": True,
+                "verdict": "Safe",
+                "details": f"Known {reputation['category']} domain {reputation['matched']}; Safe Browsing not needed",
+                "threats": []
+            }
+        else:
+            safety_result = check_url_safety(url)
+        safety_verdict = "Safe" if safety_result.get("safe") else "Unsafe"
+
+        # Read the page unless it is known to be dangerous
+        page = fetch_page(url) if safety_result.get("safe") is not False else None
+        page_text = truncate_to_budget(compact(page["text"]), TEXT_TOKEN_BUDGET) if page and page["text"] else ""
+        if not reputation and page and page["final_url"] != url:
+            # Shorteners only reveal the real domain after the redirects
+            reputation = domain_index.lookup(page["final_url"])
+        source_context = f"Source Reputation: {reputation['evidence']} ({reputation['matched']})\n" if reputation else ""
+
+        # Single content analysis
+        schema = f'{{"verdict":"Real"|"Fake"|"Misleading"|"Unverified","summary":"Brief analysis...","proofs":["Evidence 1","Evidence 2"],"confidence":85,"safety_status":"{safety_verdict}"}}'
+        if page_text:
+            context = f"URL: {page['final_url']}\nSafety Status: {safety_verdict}\n{source_context}Title: {page['title']}\n"
+            prompt = build_prompt("Page Content", page_text, schema, context)
+        else:
+            prompt = f"""
+You are a fact-checking assistant. Analyze this URL and respond ONLY with valid JSON:
+{schema}
+
+URL: {url}
+Safety Status: {safety_verdict}
+{source_context}"""
+        try:
+            parsed_result = gemini_verdict(prompt, summary="URL analysis completed", proofs=["Domain and safety analyzed"])
+        except DeadlineExceeded as e:
+            # The safety check alone still answers "is this link dangerous"
+            log.warning("Link verification timed out: %s", e)
+            parsed_result = timed_out_verdict("Content analysis ran out of time; only the safety check completed")
+            parsed_result["safety_status"] = safety_verdict
+            parsed_result["safety_check"] = safety_result
+            return parsed_result, 200
+
+        # Add safety info
+        parsed_result["safety_check"] = safety_result
+        if reputation:
+            parsed_result["source_reputation"] = reputation
+        if page:
+            parsed_result["page"] = {k: page[k] for k in ("final_url", "title", "status", "cached", "truncated")}
+
+        # Save history
+        history_data = {
+            "type": "link",
+            "content": url,
+            "verdict": parsed_result["verdict"],
+            "summary": parsed_result["summary"],
+            "proofs": parsed_result["proofs"],
+            "confidence": parsed_result["confidence"],
+            "safety_check": safety_result
+        }
+        save_verification_history(user_id, history_data)
+        
+        return parsed_result, 200
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        return {
+            "verdict": "Unverified", 
+            "summary": f"Link verification failed: {str(e)}",
+            "proofs": ["Technical error during verification"],
+            "confidence": 0,
+            "safety_check": {"error": str(e)}
+        }, 500
+
+
+def reputation_verdict(url, reputation):
+    """Verdict straight from the domain index, or None when the link needs checking"""
+    metrics.inc("verifynow_domain_index_total", category=reputation["category"] if reputation else "unlisted")
+    if not reputation:
+        return None
+    safety_check = {"safe": True, "verdict": "Safe", "details": f"Listed {reputation['category']} domain", "threats": []}
+    if reputation["category"] == "satire":
+        return {
+            "verdict": "Misleading",
+            "summary": f"{reputation['matched']} publishes satire; its stories are jokes written to look like news.",
+            "proofs": [reputation["evidence"]],
+            "confidence": 90,
+            "safety_status": "Safe",
+            "safety_check": safety_check,
+            "source_reputation": reputation
+        }
+    if reputation["category"] in TRUSTED and urlparse(url).path in ("", "/") and not urlparse(url).query:
+        # A homepage makes no specific claim to check
+        return {
+            "verdict": "Real",
+            "summary": f"{reputation['domain']} is the homepage of a known {reputation['category']} source.",
+            "proofs": [reputation["evidence"]],
+            "confidence": 80,
+            "safety_status": "Safe",
+            "safety_check": safety_check,
+            "source_reputation": reputation
+        }
+    return None
+
+
+def fetch_page(url):
+    """Extracted page for url, or None if it cannot be read in time"""
+    if not PAGE_FETCH:
+        return None
+    try:
+        timeout = current_deadline.get().timeout(PAGE_FETCH_TIMEOUT, minimum=GEMINI_MIN_SECONDS + 1, stage="page_fetch")
+        return page_fetcher.fetch(url, timeout=timeout)
+    except (FetchError, DeadlineExceeded) as e:
+        log.info("Page fetch skipped for %s: %s", urlparse(url).hostname, e)
+    except Exception as e:
+        log.warning("Page fetch failed for %s: %s", urlparse(url).hostname, e)
+    return None
+
+
+def normalize_url(url):
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+
+quota = QuotaGovernor(os.getenv("QUOTA_SQLITE_PATH", "quota.db"), UPSTREAM_QUOTAS)
+
+history_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history")
+
+hedger = Hedger(HEDGE_PERCENTILE, HEDGE_MAX_RATE, workers=2 * GEMINI_WORKER_SLOTS)
+
+rate_limiter = RateLimiter(
+    os.getenv("ADMISSION_SQLITE_PATH", "admission.db"),
+    per_minute=RATE_LIMIT_PER_MINUTE,
+    burst=RATE_LIMIT_BURST
+)
+
+gemini_scheduler = FairScheduler(
+    GEMINI_WORKER_SLOTS,
+    max_waiting=max(GEMINI_MAX_WAITING // WEB_CONCURRENCY, 1),
+    max_wait=GEMINI_MAX_WAIT,
+    weights=GEMINI_USER_WEIGHTS
+)
+
+# Reputation of well-known domains, rebuilt from the CSV when it changes
+domain_index = DomainIndex(
+    os.getenv("DOMAIN_LIST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "domain_reputation.csv")),
+    os.getenv("DOMAIN_INDEX_PATH", "domain_reputation.idx")
+)
+
+page_fetcher = PageFetcher(
+    os.getenv("PAGE_CACHE_PATH", "page_cache.db"),
+    max_bytes=PAGE_MAX_BYTES,
+    fresh_for=int(os.getenv("PAGE_CACHE_FRESH", 600))
+)
+
+# -------------------------
+# Dependency Probes
+# -------------------------
+def probe_gemini():
+    """Model metadata lookups, which spend no tokens"""
+    reachable, error = [], None
+    for tier, models in MODEL_TIERS.items():
+        try:
+            genai.get_model(models[0], request_options={"timeout": 10})
+            reachable.append(tier)
+        except Exception as e:
+            error = e
+    if not reachable:
+        log.warning("No Gemini model reachable: %s", error)
+        raise ProbeFailed(f"No Gemini model reachable ({type(error).__name__})")
+    return "Reachable tiers: " + ", ".join(reachable)
+
+
+def probe_history():
+    get_history_store().ping()
+    return f"{os.getenv('HISTORY_BACKEND', 'supabase')} reachable"
+
+
+def probe_safe_browsing():
+    """List the threat lists, which is no URL lookup and skips the quota governor"""
+    api_key = os.getenv("GOOGLE_SAFE_BROWSING_API_KEY")
+    if not api_key:
+        raise ProbeFailed("Safe Browsing API key not configured")
+    response = requests.get(
+        SAFE_BROWSING_URL.rsplit("/", 1)[0] + "/threatLists",
+        headers={"X-Goog-Api-Key": api_key},
+        timeout=SAFE_BROWSING_TIMEOUT
+    )
+    if response.status_code != 200:
+        raise ProbeFailed(f"Safe Browsing API returned {response.status_code}")
+    return "Threat lists API answering"
+
+
+def probe_ocr():
+    import pytesseract
+    return f"tesseract {pytesseract.get_tesseract_version()}"
+
+
+STARTED_AT = time.time()
+probes = DependencyProbes()
+probes.register("gemini", probe_gemini, PROBE_INTERVALS["gemini"])
+probes.register("history", probe_history, PROBE_INTERVALS["history"])
+probes.register("safe_browsing", probe_safe_browsing, PROBE_INTERVALS["safe_browsing"])
+probes.register("ocr", probe_ocr, PROBE_INTERVALS["ocr"])
+
+claim_cache = ClaimCache(
+    os.getenv("CLAIM_CACHE_PATH", "claim_cache.db"),
+    ttl=int(os.getenv("CLAIM_CACHE_TTL", 7 * 24 * 3600))
+)
+
+# Background pipelines for POST /api/jobs
+job_queue = JobQueue(
+    os.getenv("JOBS_SQLITE_PATH", "jobs.db"),
+    runners={
+        "text": run_text_verification,
+        "link": run_link_verification,
+        "image": run_image_verification
+    },
+    workers=int(os.getenv("JOB_WORKERS", 2)),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", 50)),
+    ttl=int(os.getenv("JOB_RESULT_TTL", 3600)),
+    deadline=JOB_DEADLINE
+)
 
 
 # -------------------------
@@ -253,6 +1072,31 @@ def home():
     return "✅ VerifyNow Flask Backend Running!"
 
 
+# --- Health ---
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: answers whenever the process does; dependency state is informational"""
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - STARTED_AT, 1),
+        "dependencies": probes.snapshot()
+    })
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: warmed up and every READY_REQUIRES dependency up, from cached probe results"""
+    dependencies = probes.snapshot()
+    failing = [name for name in READY_REQUIRES if dependencies.get(name, {}).get("status") != "up"]
+    ready = warmup_done.is_set() and not failing
+    body = {"ready": ready, "warm": warmup_done.is_set(), "dependencies": dependencies}
+    if not ready:
+        body["failing"] = failing
+        return jsonify(body), 503, {"Retry-After": "5"}
+    return jsonify(body)
+
+
 # --- Google Login ---
 @app.route("/api/google-login", methods=["POST"])
 def google_login():
@@ -261,7 +1105,8 @@ def google_login():
         return jsonify({"message": "Missing ID token"}), 400
 
     try:
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), GOOGLE_CLIENT_ID)
+        with metrics.timed("id_token"):
+            idinfo = id_token.verify_oauth2_token(token, google_certs, GOOGLE_CLIENT_ID)
 
         user_id = idinfo["sub"]
         user_email = idinfo["email"]
@@ -291,7 +1136,7 @@ def google_login():
             }
         }), 200
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Login failed")
         return jsonify({"message": f"Login failed: {e}"}), 401
 
 
@@ -316,7 +1161,7 @@ def verify_token():
     except InvalidTokenError:
         return jsonify({"valid": False, "message": "Invalid token"}), 401
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Token verification failed")
         return jsonify({"valid": False, "message": f"Token verification failed: {e}"}), 500
 
 
@@ -335,49 +1180,16 @@ def verify_text():
     if not text:
         return jsonify({"message": "No text provided"}), 400
 
-    try:
-        # Single API call - no intermediate steps
-        prompt = f"""
-You are a fact-checking assistant. Analyze this statement and respond ONLY with valid JSON:
-{{"verdict":"Real"|"Fake"|"Misleading"|"Unverified","summary":"Brief analysis...","proofs":["Evidence 1","Evidence 2"],"confidence":85}}
+    limited = enforce_rate_limit(user["id"])
+    if limited:
+        return limited
 
-Statement: "{text}"
-"""
-        response = call_gemini_working(prompt)
-        parsed = extract_json(response)
-        
-        # Ensure all required fields are present
-        if not parsed.get("verdict"):
-            parsed["verdict"] = "Unverified"
-        if not parsed.get("summary"):
-            parsed["summary"] = "Analysis completed"
-        if not parsed.get("proofs"):
-            parsed["proofs"] = ["Content analyzed"]
-        if not parsed.get("confidence"):
-            parsed["confidence"] = 75
-
-        # Save to history (this happens after response is ready)
-        history_data = {
-            "type": "text",
-            "content": text[:200],
-            "verdict": parsed["verdict"],
-            "summary": parsed["summary"],
-            "proofs": parsed["proofs"],
-            "confidence": parsed["confidence"]
-        }
-        save_verification_history(user["id"], history_data)
-        
-        return jsonify(parsed), 200
-        
-    except Exception as e:
-        traceback.print_exc()
-        # Return complete error response immediately
-        return jsonify({
-            "verdict": "Unverified", 
-            "summary": f"Verification failed: {str(e)}",
-            "proofs": ["Technical error during analysis"],
-            "confidence": 0
-        }), 500
+    decompose = data.get("decompose")
+    if decompose is not None:
+        # Only an explicit yes turns it on; "false", 0 and friends do not
+        decompose = decompose is True or str(decompose).lower() in ("1", "true", "yes")
+    result, status = run_text_verification(user["id"], text, decompose)
+    return jsonify(select_fields(result, requested_fields())), status
 
 # --- Verify Image (Optimized) ---
 @app.route("/api/verify-image", methods=["POST"])
@@ -389,62 +1201,17 @@ def verify_image():
     if not user:
         return jsonify({"message": "Invalid or expired token"}), 401
 
-    try:
-        image_file = request.files.get("image")
-        if not image_file:
-            return jsonify({"message": "No image uploaded"}), 400
-
-        # Single processing flow
-        local_path = save_temp_uploaded_file(image_file)
-        
-        # Extract text/description (single step)
-        image_description = extract_text_from_image(local_path)
-
-        # Analyze with Gemini (single step)
-        prompt = f"""
-You are a fact-checking assistant. Analyze this image description and respond ONLY with valid JSON:
-{{"verdict":"Real"|"Fake"|"Misleading"|"Unverified","summary":"Brief analysis...","proofs":["Evidence 1","Evidence 2"],"confidence":85}}
-
-Image Description: "{image_description}"
-"""
-        analysis_result = call_gemini_working(prompt)
-        parsed_result = extract_json(analysis_result)
-
-        # Ensure complete response
-        if not parsed_result.get("verdict"):
-            parsed_result["verdict"] = "Unverified"
-        if not parsed_result.get("summary"):
-            parsed_result["summary"] = "Image analysis completed"
-        if not parsed_result.get("proofs"):
-            parsed_result["proofs"] = ["Visual content analyzed"]
-        if not parsed_result.get("confidence"):
-            parsed_result["confidence"] = 75
+    image_file = request.files.get("image")
+    if not image_file:
+        return jsonify({"message": "No image uploaded"}), 400
 
-        # Add context
-        parsed_result["image_analysis"] = image_description[:500]
-
-        # Save history
-        history_data = {
-            "type": "image",
-            "content": image_description,
-            "verdict": parsed_result["verdict"],
-            "summary": parsed_result["summary"],
-            "proofs": parsed_result["proofs"],
-            "confidence": parsed_result["confidence"]
-        }
-        save_verification_history(user["id"], history_data)
-        
-        # Clean up
-        if local_path and os.path.exists(local_path):
-            os.remove(local_path)
-
-        return jsonify(parsed_result), 200
+    limited = enforce_rate_limit(user["id"])
+    if limited:
+        return limited
 
+    try:
+        local_path = save_temp_uploaded_file(image_file)
     except Exception as e:
-        # Clean up on error
-        if 'local_path' in locals() and local_path and os.path.exists(local_path):
-            os.remove(local_path)
-            
         return jsonify({
             "verdict": "Unverified", 
             "summary": f"Image verification failed: {str(e)}",
@@ -452,6 +1219,9 @@ Image Description: "{image_description}"
             "confidence": 0
         }), 500
 
+    result, status = run_image_verification(user["id"], local_path)
+    return jsonify(select_fields(result, requested_fields())), status
+
 # --- Verify Link (Optimized) ---
 @app.route("/api/verify-link", methods=["POST"])
 def verify_link():
@@ -468,60 +1238,197 @@ def verify_link():
     if not url:
         return jsonify({"message": "No URL provided"}), 400
 
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
+    limited = enforce_rate_limit(user["id"])
+    if limited:
+        return limited
+
+    result, status = run_link_verification(user["id"], normalize_url(url))
+    return jsonify(select_fields(result, requested_fields())), status
+
+
+# --- Verification Jobs ---
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"message": "Auth required"}), 401
+    user = verify_jwt(auth_header.split(" ")[1])
+    if not user:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    # Images come as multipart form data, text and links as JSON
+    data = request.form if request.files else (request.get_json(silent=True) or {})
+    kind = data.get("type")
+    priority = data.get("priority", "normal")
+    if priority == "high" and not verify_admin(auth_header):
+        # Anyone may yield with "low"; jumping the queue is for admins only
+        priority = "normal"
+
+    if kind == "text" and not data.get("text"):
+        return jsonify({"message": "No text provided"}), 400
+    if kind == "link" and not data.get("url"):
+        return jsonify({"message": "No URL provided"}), 400
+    if kind == "image" and not request.files.get("image"):
+        return jsonify({"message": "No image uploaded"}), 400
+    if kind not in ("text", "link", "image"):
+        return jsonify({"message": "Job type must be text, link or image"}), 400
+
+    # Only requests that would really run are charged
+    limited = enforce_rate_limit(user["id"])
+    if limited:
+        return limited
+
+    if kind == "text":
+        payload = data.get("text")
+    elif kind == "link":
+        payload = normalize_url(data.get("url"))
+    else:
+        payload = save_temp_uploaded_file(request.files.get("image"))
 
     try:
-        # Single safety check
-        safety_result = check_url_safety(url)
-        safety_verdict = "Safe" if safety_result.get("safe") else "Unsafe"
+        job_id = job_queue.submit(user["id"], kind, payload, priority)
+    except JobQueueFull:
+        if kind == "image" and os.path.exists(payload):
+            os.remove(payload)
+        return jsonify({"message": "Too many pending jobs, try again shortly"}), 503, {"Retry-After": "5"}
+
+    return jsonify({
+        "id": job_id,
+        "status": "queued",
+        "statusUrl": f"/api/jobs/{job_id}",
+        "eventsUrl": f"/api/jobs/{job_id}/events"
+    }), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"message": "Auth required"}), 401
+    user = verify_jwt(auth_header.split(" ")[1])
+    if not user:
+        return jsonify({"message": "Invalid or expired token"}), 401
 
-        # Single content analysis
-        prompt = f"""
-You are a fact-checking assistant. Analyze this URL and respond ONLY with valid JSON:
-{{"verdict":"Real"|"Fake"|"Misleading"|"Unverified","summary":"Brief analysis...","proofs":["Evidence 1","Evidence 2"],"confidence":85,"safety_status":"{safety_verdict}"}}
+    job = job_queue.get(job_id, user["id"])
+    if not job:
+        return jsonify({"message": "Job not found or expired"}), 404
+    if job.get("result"):
+        job["result"] = select_fields(job["result"], requested_fields())
+    return jsonify(job), 200
 
-URL: {url}
-Safety Status: {safety_verdict}
-"""
-        gemini_response = call_gemini_working(prompt)
-        parsed_result = extract_json(gemini_response)
-
-        # Ensure complete response
-        if not parsed_result.get("verdict"):
-            parsed_result["verdict"] = "Unverified"
-        if not parsed_result.get("summary"):
-            parsed_result["summary"] = "URL analysis completed"
-        if not parsed_result.get("proofs"):
-            parsed_result["proofs"] = ["Domain and safety analyzed"]
-        if not parsed_result.get("confidence"):
-            parsed_result["confidence"] = 75
 
-        # Add safety info
-        parsed_result["safety_check"] = safety_result
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    # EventSource cannot send headers, so the token may also come as ?token=
+    auth_header = request.headers.get("Authorization", "")
+    token = auth_header.split(" ")[1] if auth_header.startswith("Bearer ") else request.args.get("token")
+    if not token:
+        return jsonify({"message": "Auth required"}), 401
+    user = verify_jwt(token)
+    if not user:
+        return jsonify({"message": "Invalid or expired token"}), 401
 
-        # Save history
-        history_data = {
-            "type": "link",
-            "content": url,
-            "verdict": parsed_result["verdict"],
-            "summary": parsed_result["summary"],
-            "proofs": parsed_result["proofs"],
-            "confidence": parsed_result["confidence"],
-            "safety_check": safety_result
-        }
-        save_verification_history(user["id"], history_data)
-        
-        return jsonify(parsed_result), 200
+    if not job_queue.get(job_id, user["id"]):
+        return jsonify({"message": "Job not found or expired"}), 404
 
-    except Exception as e:
-        return jsonify({
-            "verdict": "Unverified", 
-            "summary": f"Link verification failed: {str(e)}",
-            "proofs": ["Technical error during verification"],
-            "confidence": 0,
-            "safety_check": {"error": str(e)}
-        }), 500
+    def stream():
+        # Streams end before JOB_EVENTS_TIMEOUT; EventSource reconnects after `retry`
+        yield "retry: 2000\n\n"
+        for job in job_queue.events(job_id, user["id"], timeout=JOB_EVENTS_TIMEOUT):
+            if job is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+
+    response = Response(stream_with_context(stream()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+# --- Prometheus Metrics ---
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    # Optional bearer token so the scrape endpoint need not be public
+    metrics_token = os.getenv("METRICS_TOKEN")
+    if metrics_token and not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {metrics_token}".encode()):
+        return jsonify({"message": "Auth required"}), 401
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+# --- Admin: Profiling ---
+@app.route("/api/admin/profile", methods=["POST"])
+def arm_profile():
+    if not verify_admin(request.headers.get("Authorization", "")):
+        return jsonify({"message": "Admin access required"}), 403
+
+    data = request.get_json(silent=True) or {}
+    endpoint = data.get("endpoint")
+    if endpoint not in app.view_functions:
+        return jsonify({"message": f"Unknown endpoint: {endpoint}"}), 400
+
+    try:
+        session = profiling.arm(endpoint, data.get("mode", "cprofile"), data.get("requests"), data.get("seconds"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify(session.describe()), 201
+
+
+@app.route("/api/admin/profile", methods=["DELETE"])
+def disarm_profile():
+    if not verify_admin(request.headers.get("Authorization", "")):
+        return jsonify({"message": "Admin access required"}), 403
+
+    return jsonify({"armed": profiling.disarm(request.args.get("endpoint"))}), 200
+
+
+@app.route("/api/admin/profile/<session_id>", methods=["GET"])
+def get_profile(session_id):
+    if not verify_admin(request.headers.get("Authorization", "")):
+        return jsonify({"message": "Admin access required"}), 403
+
+    fmt = request.args.get("format", "text")
+    if fmt not in ("text", "pstats", "collapsed"):
+        return jsonify({"message": "format must be text, pstats or collapsed"}), 400
+
+    report = profiling.report(session_id, fmt, request.args.get("limit", 50, type=int))
+    if report is None:
+        return jsonify({"message": "Profile not found"}), 404
+    body, mimetype = report
+    return Response(body, mimetype=mimetype)
+
+
+@app.route("/api/admin/tracemalloc/<action>", methods=["POST"])
+def tracemalloc_control(action):
+    if not verify_admin(request.headers.get("Authorization", "")):
+        return jsonify({"message": "Admin access required"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        if action == "start":
+            return jsonify(profiling.tracemalloc_start(int(data.get("frames", 10)))), 200
+        if action == "stop":
+            return jsonify(profiling.tracemalloc_stop()), 200
+        if action == "snapshot":
+            return jsonify(profiling.take_snapshot(int(data.get("limit", 20)))), 201
+    except RuntimeError as e:
+        return jsonify({"message": str(e)}), 409
+    return jsonify({"message": f"Unknown action: {action}"}), 404
+
+
+@app.route("/api/admin/tracemalloc", methods=["GET"])
+def tracemalloc_report():
+    if not verify_admin(request.headers.get("Authorization", "")):
+        return jsonify({"message": "Admin access required"}), 403
+
+    from_id, to_id = request.args.get("from"), request.args.get("to")
+    if not (from_id and to_id):
+        return jsonify(profiling.tracemalloc_status()), 200
+
+    diff = profiling.diff_snapshots(from_id, to_id, request.args.get("limit", 20, type=int))
+    if diff is None:
+        return jsonify({"message": "Snapshot not found"}), 404
+    return jsonify({"from": from_id, "to": to_id, "diff": diff}), 200
 
 
 # --- Test Endpoints ---
@@ -579,33 +1486,118 @@ def get_verification_history():
         history = get_user_verification_history(user["id"], limit)
         
         # Format the response for frontend
-        formatted_history = []
-        for item in history:
-            formatted_history.append({
-                "id": item.get("id"),
-                "verdict": item.get("verdict"),
-                "confidence": item.get("confidence", 0),
-                "summary": item.get("summary", ""),
-                "createdAt": item.get("created_at"),
-                "inputType": item.get("type")
-            })
+        formatted_history = [format_history_item(item) for item in history]
         
-        return jsonify(formatted_history), 200
+        return jsonify(select_fields(formatted_history, requested_fields())), 200
         
     except Exception as e:
-        traceback.print_exc()
+        log.exception("Fetching history failed")
+        return jsonify({"error": str(e)}), 500
+
+
+# --- Search Verification History ---
+@app.route("/api/verification-history/search", methods=["GET"])
+def search_verification_history():
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"message": "Auth required"}), 401
+    user = verify_jwt(auth_header.split(" ")[1])
+    if not user:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"message": "No search query provided"}), 400
+
+    try:
+        page = max(request.args.get("page", 1, type=int), 1)
+        page_size = min(max(request.args.get("page_size", 20, type=int), 1), 100)
+
+        # Fetch one extra row to know whether another page exists
+        rows = get_history_store().search(user["id"], query, page_size + 1, (page - 1) * page_size)
+
+        results = []
+        for item in rows[:page_size]:
+            result = format_history_item(item)
+            result["snippet"] = item.get("snippet", "")
+            result["rank"] = item.get("rank")
+            results.append(result)
+
+        return jsonify({
+            "results": select_fields(results, requested_fields()),
+            "page": page,
+            "pageSize": page_size,
+            "hasMore": len(rows) > page_size
+        }), 200
+
+    except Exception as e:
+        log.exception("History search failed")
         return jsonify({"error": str(e)}), 500
     
 
+# --- Export Verification History ---
+@app.route("/api/verification-history/export", methods=["GET"])
+def export_verification_history():
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"message": "Auth required"}), 401
+    user = verify_jwt(auth_header.split(" ")[1])
+    if not user:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"message": f"Unsupported format: {fmt}"}), 400
+
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    filename = f"verification-history.{fmt}" + (".gz" if compress else "")
+
+    # Rows are pulled page by page with keyset cursors while the body streams
+    rows = get_history_store().iter_all(user["id"])
+    response = Response(
+        stream_with_context(export_chunks(rows, fmt, compress)),
+        mimetype="application/gzip" if compress else EXPORT_FORMATS[fmt]
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# --- Verification Stats ---
+@app.route("/api/verification-stats", methods=["GET"])
+def get_verification_stats():
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return jsonify({"message": "Auth required"}), 401
+    user = verify_jwt(auth_header.split(" ")[1])
+    if not user:
+        return jsonify({"message": "Invalid or expired token"}), 401
+
+    try:
+        # Served from counters maintained on every save, never from raw history rows
+        scope = GLOBAL_SCOPE if request.args.get("scope") == "global" else user["id"]
+        days = min(max(request.args.get("days", 30, type=int), 1), 365)
+        return jsonify(get_history_store().stats(scope, days)), 200
+
+    except Exception as e:
+        log.exception("Stats failed")
+        return jsonify({"error": str(e)}), 500
+
+
+def format_history_item(item):
+    """Shape a stored history row for the frontend"""
+    return {
+        "id": item.get("id"),
+        "verdict": item.get("verdict"),
+        "confidence": item.get("confidence", 0),
+        "summary": item.get("summary", ""),
+        "createdAt": item.get("created_at"),
+        "inputType": item.get("type")
+    }
+
+
 def save_verification_history(user_id, verification_data):
-    """Save verification result to Supabase"""
+    """Save verification result to the configured history store"""
     try:
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        
-        # Create supabase client
-        supabase: Client = create_client(supabase_url, supabase_key)
-        
         # Prepare data for insertion
         history_data = {
             "user_id": user_id,
@@ -618,41 +1610,31 @@ def save_verification_history(user_id, verification_data):
             "safety_check": verification_data.get("safety_check", {})
         }
         
-        # Insert into Supabase
-        response = supabase.table("verification_history").insert(history_data).execute()
-        
-        if hasattr(response, 'data') and response.data:
-            print(f"✅ History saved for user {user_id}")
+        if not current_deadline.get().allows(HISTORY_MIN_SECONDS):
+            # Out of time: write after the response instead of holding it up
+            history_writer.submit(get_history_store().save, history_data)
             return True
-        else:
-            print(f"❌ Failed to save history: {response}")
-            return False
+
+        with metrics.timed("history_write"):
+            saved = get_history_store().save(history_data)
+        if saved:
+            log.debug("History saved")
+            return True
+        return False
             
     except Exception as e:
-        print(f"❌ Error saving history: {e}")
+        log.error("Error saving history: %s", e)
         return False
 
 def get_user_verification_history(user_id, limit=50):
     """Get verification history for a user"""
     try:
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-        
-        # Create supabase client
-        supabase: Client = create_client(supabase_url, supabase_key)
-        
-        # Query user's history, ordered by most recent
-        response = supabase.table("verification_history")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .order("created_at", desc=True)\
-            .limit(limit)\
-            .execute()
-        
-        return response.data if hasattr(response, 'data') else []
+        # Most recent first
+        with metrics.timed("history_read"):
+            return get_history_store().recent(user_id, limit)
         
     except Exception as e:
-        print(f"❌ Error fetching history: {e}")
+        log.error("Error fetching history: %s", e)
         return []
 
 
@@ -660,5 +1642,6 @@ def get_user_verification_history(user_id, limit=50):
 # Run
 # -------------------------
 if __name__ == "__main__":
+    start_warmup()
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,42 @@
+# bench/checks.py
+# Fast invariant checks of the pure verdict helpers, no app import or API keys
+# needed. Each check raises AssertionError with what went wrong.
+#
+#   cd backend && python -m bench.checks
+import os, sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from prompting import merge_verdicts
+
+
+def check_unverified_merge_keeps_zero_confidence():
+    # What verify_long_text gets back when every section failed or timed out
+    sections = [
+        {"verdict": "Unverified", "confidence": 0, "proofs": [], "timed_out": True},
+        {"verdict": "Unverified", "confidence": 0, "proofs": []}
+    ]
+    merged = merge_verdicts(sections)
+    assert merged["verdict"] == "Unverified", merged
+    assert merged["confidence"] == 0, f"all-Unverified merge reported confidence {merged['confidence']}"
+
+
+CHECKS = [check_unverified_merge_keeps_zero_confidence]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {check.__name__}: {e}")
+        else:
+            print(f"ok   {check.__name__}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+# bench/golden.py
+# Replay a golden corpus of claims, URLs and images through the real pipeline
+# functions (run_text_verification, run_link_verification,
+# run_image_verification) with Gemini and Safe Browsing answered from recorded
+# cassettes. Reports verdict agreement next to latency, tokens and upstream
+# calls for every configuration in bench/configs.json.
+#
+# Without a recording (bench/cassettes/gemini.json) the committed synthetic
+# cassette answers instead, from the prompt text alone and after a real sleep
+# drawn from a per-tier latency profile. Its answers never look at the case
+# labels, so agreement moves when a configuration changes what the model is
+# sent (compaction, decomposition, routing to flash). The run fails when two
+# configurations cost exactly the same calls and tokens, since then the
+# corpus is not exercising what tells them apart.
+#
+#   cd backend && python -m bench.golden --record            # needs real API keys
+#   python -m bench.golden --configs baseline --output golden-results.json
+#   python -m bench.golden --synthetic                       # ignore any recording
+import os, sys, json, math, time, random, shutil, hashlib, argparse, tempfile, threading, subprocess
+from types import SimpleNamespace
+from collections import Counter
+from urllib.parse import urlparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus", "golden.jsonl")
+CONFIGS_PATH = os.path.join(BENCH_DIR, "configs.json")
+CASSETTE_PATH = os.path.join(BENCH_DIR, "cassettes", "gemini.json")
+SYNTHETIC_PATH = os.path.join(BENCH_DIR, "cassettes", "synthetic.json")
+
+
+class CassetteMiss(Exception):
+    """No recording exists for this exact upstream request"""
+
+
+class Cassette:
+    """Recorded upstream responses keyed by a hash of the request"""
+
+    def __init__(self, path, record=False):
+        self.path = path
+        self.record = record
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+        self.calls = self.misses = self.prompt_tokens = self.output_tokens = 0
+        self.upstream_seconds = 0.0
+        self.calls_by_upstream = Counter()
+
+    @staticmethod
+    def key(kind, model, parts):
+        digest = hashlib.sha256()
+        digest.update(f"{kind}\0{model}\0".encode())
+        for part in parts:
+            if isinstance(part, dict):
+                digest.update(part.get("mime_type", "").encode() + b"\0" + part.get("data", b""))
+            else:
+                digest.update(str(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def play(self, key):
+        with self.lock:
+            self.calls += 1
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                raise CassetteMiss(key)
+            self.calls_by_upstream[entry.get("model", "safebrowsing")] += 1
+            self.prompt_tokens += entry.get("prompt_tokens", 0)
+            self.output_tokens += entry.get("output_tokens", 0)
+            self.upstream_seconds += entry.get("latency_ms", 0) / 1000
+        return entry
+
+    def store(self, key, entry):
+        with self.lock:
+            self.calls += 1
+            self.entries[key] = entry
+            self.calls_by_upstream[entry.get("model", "safebrowsing")] += 1
+            self.prompt_tokens += entry.get("prompt_tokens", 0)
+            self.output_tokens += entry.get("output_tokens", 0)
+            self.upstream_seconds += entry.get("latency_ms", 0) / 1000
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+
+    def counters(self):
+        return {
+            "upstream_calls": self.calls,
+            "cassette_misses": self.misses,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "upstream_ms": round(self.upstream_seconds * 1000, 1),
+            "calls_by_upstream": dict(sorted(self.calls_by_upstream.items()))
+        }
+
+
+class SyntheticCassette(Cassette):
+    """Scripted stand-in for a recording that answers from the prompt alone.
+
+    Each scripted statement whose phrases all appear in the prompt
+    contributes its answer (flash has its own, sometimes wrong, answers);
+    agreeing answers stand, true and false ones together make Misleading,
+    and a prompt matching nothing is Unverified. Case labels are never read,
+    so agreement depends on what each configuration actually sends. Latency
+    is slept for real (times GOLDEN_TIME_SCALE) so fallbacks and hedges
+    behave as they would live; tokens are estimated from the actual prompts.
+    """
+
+    def __init__(self, path, time_scale=1.0):
+        super().__init__(path)
+        self.script, self.entries = self.entries, {}
+        self.time_scale = time_scale
+
+    def answer(self, prompt, tier):
+        text = prompt.lower()
+        answers = []
+        for statement in self.script["statements"]:
+            if all(phrase in text for phrase in statement["match"]):
+                answer = dict(statement, **statement.get(tier, {}))
+                if answer["verdict"] != "Unverified":
+                    answers.append(answer)
+        if not answers:
+            return dict(self.script["unmatched"])
+
+        verdicts = {answer["verdict"] for answer in answers}
+        if len(verdicts) == 1:
+            verdict = verdicts.pop()
+        else:
+            verdict = "Misleading" if "Real" in verdicts else "Fake"
+        # Flash answers tersely: one proof per statement instead of all of them
+        proofs = [proof for answer in answers for proof in (answer["proofs"][:1] if tier == "flash" else answer["proofs"])]
+        return {
+            "verdict": verdict,
+            "summary": " ".join(answer["summary"] for answer in answers[:3]),
+            "proofs": proofs,
+            "confidence": min((answer["confidence"] for answer in answers if answer["verdict"] == verdict), default=70)
+        }
+
+    def generate(self, model, parts):
+        from prompting import estimate_tokens
+
+        tier = "flash" if "flash" in model else "pro"
+        images = sum(1 for part in parts if isinstance(part, dict))
+        prompt = " ".join(str(part) for part in parts if not isinstance(part, dict))
+        text = self.script["description"] if images else json.dumps(self.answer(prompt, tier))
+        prompt_tokens = estimate_tokens(prompt) + 258 * images
+
+        # Seeded by the request itself, so a rerun sleeps the same whatever the thread order
+        rng = random.Random(Cassette.key("gemini", model, parts))
+        profile = self.script["latency_ms"][tier]
+        latency_ms = profile["median"] * (1 + profile["per_1k_prompt_tokens"] * prompt_tokens / 1000) * math.exp(profile["sigma"] * rng.gauss(0, 1))
+        time.sleep(latency_ms / 1000 * self.time_scale)
+
+        entry = {
+            "model": model,
+            "text": text,
+            "latency_ms": round(latency_ms, 1),
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": estimate_tokens(text)
+        }
+        self.store(Cassette.key("gemini", model, parts), entry)
+        return entry
+
+    def safety(self, url):
+        host = urlparse(url).hostname or ""
+        if host in self.script["unsafe_hosts"]:
+            result = {"safe": False, "verdict": "Unsafe", "details": "Found 1 security threat(s)",
+                      "threats": [{"threat_type": "MALWARE", "platform": "ANY_PLATFORM", "url": url}]}
+        else:
+            result = {"safe": True, "verdict": "Safe", "details": "No security threats detected", "threats": []}
+        self.store(Cassette.key("safebrowsing", "v4", [url]), {"result": result, "latency_ms": self.script["latency_ms"]["safebrowsing"]})
+        return result
+
+
+def install_cassette(app_module, cassette):
+    """Route the app's Gemini and Safe Browsing calls through the cassette"""
+    real_model = app_module.genai.GenerativeModel
+    real_safety = app_module.check_url_safety
+
+    class CassetteModel:
+        def __init__(self, model_name, *args, **kwargs):
+            self.model_name = model_name
+            self.args, self.kwargs = args, kwargs
+
+        def generate_content(self, contents, *args, **kwargs):
+            parts = contents if isinstance(contents, list) else [contents]
+            key = Cassette.key("gemini", self.model_name, parts)
+            if not cassette.record:
+                if isinstance(cassette, SyntheticCassette):
+                    entry = cassette.generate(self.model_name, parts)
+                else:
+                    entry = cassette.play(key)
+                if entry.get("error"):
+                    raise Exception(entry["error"])
+                return SimpleNamespace(text=entry["text"], usage_metadata=SimpleNamespace(
+                    prompt_token_count=entry.get("prompt_tokens", 0),
+                    candidates_token_count=entry.get("output_tokens", 0),
+                    total_token_count=entry.get("prompt_tokens", 0) + entry.get("output_tokens", 0)
+                ))
+
+            start = time.perf_counter()
+            try:
+                response = real_model(self.model_name, *self.args, **self.kwargs).generate_content(contents, *args, **kwargs)
+            except Exception as e:
+                cassette.store(key, {"model": self.model_name, "error": str(e),
+                                     "latency_ms": round((time.perf_counter() - start) * 1000, 1)})
+                raise
+            usage = getattr(response, "usage_metadata", None)
+            cassette.store(key, {
+                "model": self.model_name,
+                "text": response.text,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+                "output_tokens": getattr(usage, "candidates_token_count", 0) or 0
+            })
+            return response
+
+    def cassette_safety(url):
+        key = Cassette.key("safebrowsing", "v4", [url])
+        if isinstance(cassette, SyntheticCassette):
+            return cassette.safety(url)
+        if not cassette.record:
+            try:
+                return cassette.play(key)["result"]
+            except CassetteMiss:
+                return {"error": "No Safe Browsing recording"}
+        start = time.perf_counter()
+        result = real_safety(url)
+        cassette.store(key, {"result": result, "latency_ms": round((time.perf_counter() - start) * 1000, 1)})
+        return result
+
+    app_module.genai.GenerativeModel = CassetteModel
+    app_module.check_url_safety = cassette_safety
+
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_case(app_module, case, tmpdir):
+    if case["type"] == "text":
+        return app_module.run_text_verification("golden", case["input"])
+    if case["type"] == "link":
+        return app_module.run_link_verification("golden", app_module.normalize_url(case["input"]))
+    # The image pipeline deletes its input, so hand it a copy
+    local_path = os.path.join(tmpdir, f"{case['id']}{os.path.splitext(case['input'])[1]}")
+    shutil.copyfile(os.path.join(BACKEND_DIR, case["input"]), local_path)
+    return app_module.run_image_verification("golden", local_path)
+
+
+def replay(config_name, record=False, synthetic=False):
+    """Run the corpus once in this process and return the config's report row"""
+    tmpdir = tempfile.mkdtemp(prefix="verifynow-golden-")
+    os.environ.setdefault("GEMINI_API_KEY", "golden-replay")
+    os.environ.setdefault("GOOGLE_CLIENT_ID", "golden-replay")
+    os.environ.setdefault("JWT_SECRET_KEY", "golden-replay")
+    os.environ.update({
+        "HISTORY_BACKEND": "sqlite",
+        "HISTORY_SQLITE_PATH": os.path.join(tmpdir, "history.db"),
+        "JOBS_SQLITE_PATH": os.path.join(tmpdir, "jobs.db"),
+        "CLAIM_CACHE_PATH": os.path.join(tmpdir, "claims.db"),
+        "ADMISSION_SQLITE_PATH": os.path.join(tmpdir, "admission.db"),
+        "QUOTA_SQLITE_PATH": os.path.join(tmpdir, "quota.db"),
+        "PAGE_CACHE_PATH": os.path.join(tmpdir, "pages.db"),
+        "DOMAIN_INDEX_PATH": os.path.join(tmpdir, "domains.idx"),
+        # Live pages change under the cassettes
+        "PAGE_FETCH": "false",
+        "METRICS_DIR": os.path.join(tmpdir, "metrics")
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+
+    synthetic = synthetic or (not record and not os.path.exists(CASSETTE_PATH))
+    if synthetic:
+        cassette = SyntheticCassette(SYNTHETIC_PATH, float(os.getenv("GOLDEN_TIME_SCALE", 1.0)))
+    else:
+        cassette = Cassette(CASSETTE_PATH, record=record)
+    install_cassette(app_module, cassette)
+
+    cases, latencies, agree = [], [], 0
+    for case in load_corpus():
+        upstream_before = cassette.upstream_seconds
+        calls_before = cassette.calls
+        start = time.perf_counter()
+        result, status = run_case(app_module, case, tmpdir)
+        local = time.perf_counter() - start
+        # Recorded upstream latency stands in for the real network time; synthetic calls already slept it
+        total = local if record or synthetic else local + cassette.upstream_seconds - upstream_before
+        latencies.append(total)
+        verdict = result.get("verdict")
+        agree += verdict == case["expected"]
+        cases.append({
+            "id": case["id"],
+            "expected": case["expected"],
+            "verdict": verdict,
+            "confidence": result.get("confidence"),
+            "status": status,
+            "upstream_calls": cassette.calls - calls_before,
+            "latency_ms": round(total * 1000, 1)
+        })
+
+    if record:
+        cassette.save()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+    latencies.sort()
+    pick = lambda pct: round(latencies[max(0, math.ceil(len(latencies) * pct / 100) - 1)] * 1000, 1)
+    return {
+        "config": config_name,
+        "cassette": "synthetic" if synthetic else "recorded",
+        "cases": len(cases),
+        "agreement": round(agree / len(cases), 3) if cases else None,
+        "latency_ms": {"p50": pick(50), "p95": pick(95), "total": round(sum(latencies) * 1000, 1)},
+        **cassette.counters(),
+        "results": cases
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-corpus verdict regression benchmark")
+    parser.add_argument("--configs", help="Comma-separated names from bench/configs.json (default: all)")
+    parser.add_argument("--record", action="store_true", help="Call the real upstreams and update the cassette")
+    parser.add_argument("--synthetic", action="store_true", help="Replay the scripted synthetic cassette even if a recording exists")
+    parser.add_argument("--output", default="golden-results.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(replay(args.child, args.record, args.synthetic)))
+        return
+
+    with open(CONFIGS_PATH) as f:
+        configs = json.load(f)
+    names = args.configs.split(",") if args.configs else list(configs)
+
+    # One process per configuration, so settings read at import time apply cleanly
+    rows = []
+    for name in names:
+        # The child's result is its last stdout line, so its logs go to stderr
+        env = {**os.environ, "LOG_STREAM": "stderr", **{k: str(v) for k, v in configs[name].items()}}
+        command = [sys.executable, "-m", "bench.golden", "--child", name] + (["--record"] if args.record else []) + (["--synthetic"] if args.synthetic else [])
+        output = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        rows.append(row)
+        print(f"{name:<20} agreement {row['agreement']:.1%}  p50 {row['latency_ms']['p50']}ms  "
+              f"p95 {row['latency_ms']['p95']}ms  calls {row['upstream_calls']}  "
+              f"tokens {row['prompt_tokens'] + row['output_tokens']}  misses {row['cassette_misses']}")
+
+    with open(args.output, "w") as f:
+        json.dump({"corpus": CORPUS_PATH, "configs": rows}, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    same = indistinguishable(rows)
+    for group in same:
+        print(f"{', '.join(group)}: identical calls and tokens; the corpus does not exercise what sets them apart")
+    if same:
+        sys.exit(1)
+
+
+def indistinguishable(rows):
+    """Groups of configurations whose runs made exactly the same upstream calls and tokens"""
+    groups = {}
+    for row in rows:
+        cost = (row["upstream_calls"], row["prompt_tokens"], row["output_tokens"], json.dumps(row["calls_by_upstream"], sort_keys=True))
+        groups.setdefault(cost, []).append(row["config"])
+    return [names for names in groups.values() if len(names) > 1]
+
+
+if __name__ == "__main__":
+    main()
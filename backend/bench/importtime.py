@@ -0,0 +1,124 @@
+# bench/importtime.py
+# Cold-start cost of `import app`, measured with `python -X importtime` in a
+# fresh interpreter per run. Reports wall time and the heaviest top-level
+# imports, and flags heavy SDKs that are still loaded eagerly.
+#
+#   cd backend && python -m bench.importtime --output importtime-baseline.json
+#   python -m bench.importtime --compare importtime-baseline.json
+import os, sys, json, argparse, tempfile, statistics, subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+# Packages that should only load on first use or during warm-up
+HEAVY_PACKAGES = ("google.generativeai", "google.oauth2", "google.auth", "grpc", "supabase", "torch", "transformers")
+
+PROBE = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+
+def run_once(tmpdir):
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "importtime",
+        "GOOGLE_CLIENT_ID": "importtime",
+        "JWT_SECRET_KEY": "importtime",
+        "HISTORY_BACKEND": "sqlite",
+        "HISTORY_SQLITE_PATH": os.path.join(tmpdir, "history.db"),
+        "JOBS_SQLITE_PATH": os.path.join(tmpdir, "jobs.db"),
+        "CLAIM_CACHE_PATH": os.path.join(tmpdir, "claims.db"),
+        "ADMISSION_SQLITE_PATH": os.path.join(tmpdir, "admission.db"),
+        "QUOTA_SQLITE_PATH": os.path.join(tmpdir, "quota.db"),
+        "PAGE_CACHE_PATH": os.path.join(tmpdir, "pages.db"),
+        "DOMAIN_INDEX_PATH": os.path.join(tmpdir, "domains.idx"),
+        "METRICS_DIR": os.path.join(tmpdir, "metrics"),
+        "LOG_STREAM": "stderr"
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import app failed:\n{proc.stderr[-2000:]}")
+    return float(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The column header line
+            continue
+        # Nesting is shown as two spaces per level after the separator's own space
+        name = fields[2][1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def summarize(runs, top):
+    walls = [wall for wall, _ in runs]
+    _, rows = runs[walls.index(statistics.median_low(walls))]
+    modules = {name for name, _, _, _ in rows}
+    # Depth 0 holds what app.py (and its siblings) pulled in directly or transitively first
+    top_level = sorted((r for r in rows if r[3] == 0), key=lambda r: r[2], reverse=True)
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "runs": len(runs),
+        "modules": len(rows),
+        "top_imports": [{"module": name, "cumulative_ms": round(cum / 1000, 1)} for name, _, cum, _ in top_level[:top]],
+        "eager_heavy": [p for p in HEAVY_PACKAGES if p in modules]
+    }
+
+
+def print_report(report, baseline=None):
+    line = f"import app: {report['wall_ms']:.1f} ms median of {report['runs']} runs, {report['modules']} modules"
+    if baseline:
+        delta = report["wall_ms"] - baseline["wall_ms"]
+        line += f" ({delta:+.1f} ms vs baseline {baseline['wall_ms']:.1f})"
+    print(line)
+    for item in report["top_imports"]:
+        print(f"  {item['cumulative_ms']:>9.1f} ms  {item['module']}")
+    print("Heavy packages loaded at import: " + (", ".join(report["eager_heavy"]) or "none"))
+    if baseline:
+        gone = sorted(set(baseline["eager_heavy"]) - set(report["eager_heavy"]))
+        added = sorted(set(report["eager_heavy"]) - set(baseline["eager_heavy"]))
+        if gone:
+            print("  no longer eager: " + ", ".join(gone))
+        if added:
+            print("  newly eager: " + ", ".join(added))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark for app.py")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters to run")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest top-level imports to list")
+    parser.add_argument("--output", help="Write the report as JSON (e.g. a baseline)")
+    parser.add_argument("--compare", help="Earlier report to diff against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="verifynow-importtime-") as tmpdir:
+        runs = [run_once(tmpdir) for _ in range(args.repeat)]
+    report = summarize(runs, args.top)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# bench/loadtest.py
+# Drive the /api/verify-* and history endpoints at fixed concurrency levels
+# against local upstream stubs, and write throughput and latency percentiles
+# to a JSON artifact that can be diffed across commits.
+#
+#   cd backend && python -m bench.loadtest --profile fast --concurrency 1,4,16
+#   python -m bench.loadtest --compare bench-results-old.json --output bench-results.json
+import os, sys, json, math, time, argparse, datetime, platform, tempfile, subprocess, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+import requests
+
+from bench.stubs import start_stub_server, PROFILES
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_SECRET = "bench-secret-not-for-production"
+
+CLAIMS = [
+    "The Eiffel Tower is located in Berlin.",
+    "Drinking water helps regulate body temperature.",
+    "The moon landing in 1969 was staged in a studio.",
+    "India has the largest population in the world as of 2024.",
+    "5G towers spread viruses."
+]
+URLS = ["example.com/news/1", "https://www.bbc.co.uk/news", "http://malware.test/download"]
+
+with open(os.path.join(BACKEND_DIR, "test.jpg"), "rb") as f:
+    TEST_IMAGE = f.read()
+
+
+def mint_token(user_id="bench-user", secret=BENCH_SECRET, hours=1):
+    """Same claims generate_token.py puts in a token"""
+    payload = {
+        "id": user_id,
+        "email": f"{user_id}@bench.local",
+        "name": "Bench User",
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=hours)
+    }
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def scenario_request(name, i):
+    """(method, path, kwargs) for the i-th request of a scenario"""
+    if name == "verify-text":
+        return "POST", "/api/verify-text", {"json": {"text": CLAIMS[i % len(CLAIMS)]}}
+    if name == "verify-link":
+        return "POST", "/api/verify-link", {"json": {"url": URLS[i % len(URLS)]}}
+    if name == "verify-image":
+        return "POST", "/api/verify-image", {"files": {"image": ("test.jpg", TEST_IMAGE, "image/jpeg")}}
+    if name == "history":
+        return "GET", "/api/verification-history", {"params": {"limit": 50}}
+    if name == "history-search":
+        return "GET", "/api/verification-history/search", {"params": {"q": "tower"}}
+    if name == "stats":
+        return "GET", "/api/verification-stats", {}
+    if name == "export":
+        return "GET", "/api/verification-history/export", {"params": {"format": "ndjson"}}
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+SCENARIOS = ["verify-text", "verify-link", "verify-image", "history", "history-search", "stats", "export"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_level(base_url, token, name, concurrency, total):
+    """Fire `total` requests with `concurrency` in flight and summarize them"""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+    local = threading.local()
+
+    def worker():
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {token}"
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, path, kwargs = scenario_request(name, i)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, timeout=120, **kwargs)
+                _ = response.content
+                status = response.status_code
+            except requests.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "statuses": statuses,
+        "throughput_rps": round(total / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "p50": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            "p99": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            "max": round(latencies[-1] * 1000, 2) if latencies else None
+        }
+    }
+
+
+def start_local_app(stub_url, history_backend, tmpdir):
+    """Import app.py wired to the stubs and serve it in-process"""
+    os.environ.update({
+        "GEMINI_API_KEY": "bench-key",
+        "GOOGLE_CLIENT_ID": "bench-client",
+        "JWT_SECRET_KEY": BENCH_SECRET,
+        "GEMINI_API_ENDPOINT": stub_url,
+        "GOOGLE_SAFE_BROWSING_API_KEY": "bench-key",
+        "SAFE_BROWSING_URL": f"{stub_url}/v4/threatMatches:find",
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_SERVICE_ROLE_KEY": jwt.encode({"role": "service_role"}, "stub", algorithm="HS256"),
+        "HISTORY_BACKEND": history_backend,
+        "HISTORY_SQLITE_PATH": os.path.join(tmpdir, "bench_history.db"),
+        "JOBS_SQLITE_PATH": os.path.join(tmpdir, "bench_jobs.db"),
+        "CLAIM_CACHE_PATH": os.path.join(tmpdir, "bench_claims.db"),
+        "ADMISSION_SQLITE_PATH": os.path.join(tmpdir, "bench_admission.db"),
+        "QUOTA_SQLITE_PATH": os.path.join(tmpdir, "bench_quota.db"),
+        "PAGE_CACHE_PATH": os.path.join(tmpdir, "bench_pages.db"),
+        "PROFILE_SQLITE_PATH": os.path.join(tmpdir, "bench_profiling.db"),
+        # The bench measures the pipeline, not the per-user limits or the open web
+        "RATE_LIMIT_PER_MINUTE": "1000000",
+        "RATE_LIMIT_BURST": "1000000",
+        "PAGE_FETCH": "false",
+        "METRICS_DIR": os.path.join(tmpdir, "metrics")
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Print p50/p95/p99 and throughput deltas against an earlier artifact"""
+    before = {(r["scenario"], r["concurrency"]): r for r in previous["results"]}
+    print(f"\nvs {previous['meta'].get('commit')}:")
+    for row in current["results"]:
+        old = before.get((row["scenario"], row["concurrency"]))
+        if not old:
+            continue
+        deltas = []
+        for key in ("p50", "p95", "p99"):
+            a, b = old["latency_ms"][key], row["latency_ms"][key]
+            if a and b:
+                deltas.append(f"{key} {(b - a) / a * 100:+.1f}%")
+        if old["throughput_rps"] and row["throughput_rps"]:
+            deltas.append(f"rps {(row['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100:+.1f}%")
+        print(f"  {row['scenario']:<15} c={row['concurrency']:<3} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VerifyNow load test against local upstream stubs")
+    parser.add_argument("--profile", default="fast", choices=sorted(PROFILES))
+    parser.add_argument("--gemini-latency", type=float, help="Override the Gemini median latency (s)")
+    parser.add_argument("--gemini-error-rate", type=float)
+    parser.add_argument("--gemini-rpm", type=int)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and level")
+    parser.add_argument("--history", default="supabase", choices=["supabase", "sqlite"])
+    parser.add_argument("--target", help="Benchmark an already running server instead of an in-process app")
+    parser.add_argument("--secret", default=BENCH_SECRET, help="JWT secret of --target")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="Earlier artifact to diff against")
+    args = parser.parse_args()
+
+    overrides = {"gemini": {}}
+    if args.gemini_latency is not None:
+        overrides["gemini"]["median"] = args.gemini_latency
+    if args.gemini_error_rate is not None:
+        overrides["gemini"]["error_rate"] = args.gemini_error_rate
+    if args.gemini_rpm is not None:
+        overrides["gemini"]["rpm"] = args.gemini_rpm
+
+    tmpdir = tempfile.mkdtemp(prefix="verifynow-bench-")
+    stub_server, stub_url, stub_state = start_stub_server(args.profile, overrides)
+    if args.target:
+        base_url, app_server = args.target.rstrip("/"), None
+    else:
+        app_server, base_url = start_local_app(stub_url, args.history, tmpdir)
+
+    token = mint_token(secret=args.secret)
+    results = []
+    for name in args.scenarios.split(","):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            row = run_level(base_url, token, name, concurrency, args.requests)
+            results.append(row)
+            lat = row["latency_ms"]
+            print(f"{name:<15} c={concurrency:<3} {row['throughput_rps']:>8} rps  "
+                  f"p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms  ok {row['ok']}/{row['requests']}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "profile": args.profile,
+            "overrides": overrides,
+            "history_backend": args.history,
+            "target": args.target or "in-process",
+            "requests_per_level": args.requests
+        },
+        "upstream_calls": {name: u.counters() for name, u in stub_state.upstreams.items()},
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    if app_server:
+        app_server.shutdown()
+    stub_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
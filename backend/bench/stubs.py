@@ -0,0 +1,245 @@
+# bench/stubs.py
+# Local stand-ins for Gemini, Safe Browsing and the Supabase REST API. One
+# threaded HTTP server answers all three, so the app can be pointed at it with
+# GEMINI_API_ENDPOINT, SAFE_BROWSING_URL and SUPABASE_URL.
+import re, json, time, random, threading, itertools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Named upstream profiles: latency in seconds (lognormal around the median),
+# error_rate as a fraction of calls answered with 500, rpm as a 429 threshold
+PROFILES = {
+    "fast": {
+        "gemini": {"median": 0.05, "sigma": 0.3, "error_rate": 0.0, "rpm": None},
+        "safebrowsing": {"median": 0.01, "sigma": 0.2, "error_rate": 0.0, "rpm": None},
+        "supabase": {"median": 0.005, "sigma": 0.2, "error_rate": 0.0, "rpm": None}
+    },
+    "realistic": {
+        "gemini": {"median": 1.5, "sigma": 0.6, "error_rate": 0.01, "rpm": None},
+        "safebrowsing": {"median": 0.08, "sigma": 0.4, "error_rate": 0.0, "rpm": None},
+        "supabase": {"median": 0.04, "sigma": 0.5, "error_rate": 0.0, "rpm": None}
+    },
+    "flaky": {
+        "gemini": {"median": 0.5, "sigma": 1.0, "error_rate": 0.1, "rpm": None},
+        "safebrowsing": {"median": 0.05, "sigma": 0.8, "error_rate": 0.05, "rpm": None},
+        "supabase": {"median": 0.02, "sigma": 0.8, "error_rate": 0.02, "rpm": None}
+    },
+    "throttled": {
+        "gemini": {"median": 0.3, "sigma": 0.4, "error_rate": 0.0, "rpm": 60},
+        "safebrowsing": {"median": 0.02, "sigma": 0.3, "error_rate": 0.0, "rpm": 600},
+        "supabase": {"median": 0.01, "sigma": 0.3, "error_rate": 0.0, "rpm": None}
+    }
+}
+
+VERDICTS = ["Real", "Fake", "Misleading", "Unverified"]
+
+
+class Upstream:
+    """Latency, failure and quota behaviour of one stubbed service"""
+
+    def __init__(self, name, median, sigma, error_rate, rpm, seed=None):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []
+        self.calls = self.errors = self.throttled = 0
+
+    def admit(self):
+        """Return None to serve the call, or (status, retry_after) to reject it"""
+        with self.lock:
+            self.calls += 1
+            now = time.time()
+            if self.rpm:
+                self.window = [t for t in self.window if now - t < 60]
+                if len(self.window) >= self.rpm:
+                    self.throttled += 1
+                    return 429, max(1, int(60 - (now - self.window[0])) + 1)
+                self.window.append(now)
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return 500, None
+            delay = self.random.lognormvariate(0, self.sigma) * self.median
+        time.sleep(delay)
+        return None
+
+    def counters(self):
+        return {"calls": self.calls, "errors": self.errors, "throttled": self.throttled}
+
+
+class StubState:
+    def __init__(self, profile="fast", overrides=None, seed=1):
+        settings = json.loads(json.dumps(PROFILES[profile]))
+        for service, values in (overrides or {}).items():
+            settings[service].update(values)
+        self.upstreams = {
+            name: Upstream(name, seed=seed, **values) for name, values in settings.items()
+        }
+        self.rows = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+
+def gemini_body(prompt_text):
+    # Deterministic verdict per prompt so repeated runs are comparable
+    verdict = VERDICTS[sum(map(ord, prompt_text[-40:])) % len(VERDICTS)]
+    answer = json.dumps({
+        "verdict": verdict,
+        "summary": "Stubbed analysis for benchmarking.",
+        "proofs": ["Stub evidence 1", "Stub evidence 2"],
+        "confidence": 80
+    })
+    prompt_tokens = max(1, len(prompt_text) // 4)
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": answer}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": len(answer) // 4,
+            "totalTokenCount": prompt_tokens + len(answer) // 4
+        }
+    }
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def gate(self, service):
+            rejected = state.upstreams[service].admit()
+            if rejected is None:
+                return True
+            status, retry_after = rejected
+            message = "RESOURCE_EXHAUSTED" if status == 429 else "INTERNAL"
+            headers = {"Retry-After": str(retry_after)} if retry_after else None
+            self.send_json(status, {"error": {"code": status, "status": message, "message": f"stub {message}"}}, headers)
+            return False
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            if ":generateContent" in path:
+                body = self.read_json()
+                if self.gate("gemini"):
+                    texts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+                    self.send_json(200, gemini_body(" ".join(texts)))
+            elif path.endswith("threatMatches:find"):
+                body = self.read_json()
+                if self.gate("safebrowsing"):
+                    url = body["threatInfo"]["threatEntries"][0]["url"]
+                    if "malware" in url:
+                        self.send_json(200, {"matches": [{"threatType": "MALWARE", "platformType": "ANY_PLATFORM", "threat": {"url": url}}]})
+                    else:
+                        self.send_json(200, {})
+            elif path.startswith("/rest/v1/rpc/"):
+                self.read_json()
+                if self.gate("supabase"):
+                    self.send_json(200, [])
+            elif path == "/rest/v1/verification_history":
+                body = self.read_json()
+                if self.gate("supabase"):
+                    rows = body if isinstance(body, list) else [body]
+                    with state.lock:
+                        for row in rows:
+                            row["id"] = next(state.ids)
+                            row["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+                            state.rows.append(row)
+                    self.send_json(201, rows)
+            else:
+                self.send_json(404, {"error": f"no stub for {path}"})
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path == "/stub/counters":
+                self.send_json(200, {name: u.counters() for name, u in state.upstreams.items()})
+            elif parsed.path == "/rest/v1/verification_history":
+                if self.gate("supabase"):
+                    query = parse_qs(parsed.query)
+                    user = (query.get("user_id") or ["eq."])[0][3:]
+                    limit = int((query.get("limit") or [50])[0])
+                    after = keyset_filter((query.get("or") or [""])[0])
+                    with state.lock:
+                        rows = [r for r in state.rows if r.get("user_id") == user]
+                    if after:
+                        # The page() cursor: strictly older, ties broken by id
+                        rows = [r for r in rows if (r["created_at"], r["id"]) < after]
+                    for column, direction in reversed(order_terms(query.get("order") or ["created_at.desc"])):
+                        rows.sort(key=lambda r: r.get(column) or "", reverse=direction == "desc")
+                    self.send_json(200, rows[:limit])
+            elif parsed.path.endswith("/threatLists"):
+                self.send_json(200, {"threatLists": [{"threatType": "MALWARE", "platformType": "ANY_PLATFORM", "threatEntryType": "URL"}]})
+            elif re.match(r"^/rest/v1/verification_stats_\w+$", parsed.path):
+                if self.gate("supabase"):
+                    self.send_json(200, [])
+            else:
+                self.send_json(404, {"error": f"no stub for {parsed.path}"})
+
+    return StubHandler
+
+
+def keyset_filter(value):
+    """(created_at, id) from PostgREST's or=(created_at.lt.X,and(created_at.eq.X,id.lt.N)), or None"""
+    # A literal "+" in the timestamp offset arrives as a space when not percent-encoded
+    match = re.fullmatch(r"\(created_at\.lt\.(.+?),and\(created_at\.eq\.(.+?),id\.lt\.(\d+)\)\)", value.replace(" ", "+"))
+    return (match.group(1), int(match.group(3))) if match else None
+
+
+def order_terms(values):
+    """[(column, "asc"|"desc")] from one or more order= parameters"""
+    terms = []
+    for value in values:
+        for term in value.split(","):
+            column, _, direction = term.partition(".")
+            terms.append((column, "desc" if direction.startswith("desc") else "asc"))
+    return terms
+
+
+def start_stub_server(profile="fast", overrides=None, host="127.0.0.1", port=0, seed=1):
+    """Start the stubs in a daemon thread; returns (server, base_url, state)"""
+    state = StubState(profile, overrides, seed)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bench-stubs", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}", state
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the upstream stubs standalone")
+    parser.add_argument("--profile", default="fast", choices=sorted(PROFILES))
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+
+    server, url, _ = start_stub_server(args.profile, port=args.port)
+    print(f"Stubs ({args.profile}) listening on {url}")
+    print(f"  GEMINI_API_ENDPOINT={url}")
+    print(f"  SAFE_BROWSING_URL={url}/v4/threatMatches:find")
+    print(f"  SUPABASE_URL={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,100 @@
+# claims.py
+import re, json, time, hashlib, threading
+from prompting import SENTENCE_END, CLAIM_SIGNAL, estimate_tokens
+from sqlitedb import connect_sqlite
+
+# Leading chatter that does not change what a claim asserts
+LEAD_IN = re.compile(r"^(breaking( news)?|update|fact|reminder|fun fact|did you know|so|and|but|also)\s*[:,!-]*\s*", re.IGNORECASE)
+NOT_A_CLAIM = re.compile(r"\?$|^(i think|i feel|imo|in my opinion|please|let's|lets|let us|click|share|follow)\b", re.IGNORECASE)
+
+
+def extract_claims(text, max_claims=8):
+    """Split a submission into standalone factual sentences using local heuristics"""
+    claims = []
+    for sentence in SENTENCE_END.split(re.sub(r"\s+", " ", text).strip()):
+        sentence = LEAD_IN.sub("", sentence.strip(" \"'“”"))
+        tokens = estimate_tokens(sentence)
+        if tokens < 4 or tokens > 120 or NOT_A_CLAIM.search(sentence):
+            continue
+        if CLAIM_SIGNAL.search(sentence):
+            claims.append(sentence)
+    return dedupe_claims(claims)[:max_claims]
+
+
+def normalize_claim(claim):
+    """Canonical form used for dedupe and as the cache key"""
+    claim = LEAD_IN.sub("", claim.lower())
+    claim = re.sub(r"[^\w\s%.]", " ", claim)
+    claim = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", claim)
+    return re.sub(r"\s+", " ", claim).strip()
+
+
+def claim_key(claim):
+    return hashlib.sha256(normalize_claim(claim).encode()).hexdigest()
+
+
+def dedupe_claims(claims):
+    seen, unique = set(), []
+    for claim in claims:
+        key = claim_key(claim)
+        if key not in seen:
+            seen.add(key)
+            unique.append(claim)
+    return unique
+
+
+# -------------------------
+# Claim-level cache
+# -------------------------
+CLAIM_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS claim_cache (
+    key TEXT PRIMARY KEY,
+    claim TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_claim_cache_expires ON claim_cache (expires_at);
+"""
+
+
+class ClaimCache:
+    """Verified claims shared by all workers through one SQLite file"""
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+        self.writes = 0
+        self.connection().executescript(CLAIM_CACHE_SCHEMA)
+
+    def connection(self):
+        return connect_sqlite(self.path, self.local, cached_statements=64)
+
+    def get_many(self, keys):
+        """{key: result} for every key with a live entry"""
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        rows = self.connection().execute(
+            f"SELECT key, result FROM claim_cache WHERE key IN ({placeholders}) AND expires_at > ?",
+            (*keys, time.time())
+        ).fetchall()
+        return {key: json.loads(result) for key, result in rows}
+
+    def put(self, key, claim, result):
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO claim_cache (key, claim, result, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, claim, json.dumps(result), now, now + self.ttl)
+            )
+        self.writes += 1
+        if self.writes % 500 == 0:
+            self.purge()
+
+    def purge(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM claim_cache WHERE expires_at <= ?", (time.time(),))
@@ -0,0 +1,45 @@
+# deadline.py
+import time, contextvars
+
+
+class DeadlineExceeded(Exception):
+    """Not enough of the request's time budget is left for this stage"""
+
+
+class Deadline:
+    """Monotonic end time for one request or job, shared by every stage it runs"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def allows(self, seconds):
+        """True if at least `seconds` are left, for deciding on optional work"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap=None, minimum=0.5, stage="stage"):
+        """Time budget for one blocking call, never more than `cap`.
+
+        Raises DeadlineExceeded when under `minimum` is left, since a call
+        that cannot finish is worse than skipping it.
+        """
+        remaining = self.remaining()
+        if remaining < minimum:
+            raise DeadlineExceeded(f"{stage} skipped: {remaining:.1f}s of {self.seconds:.0f}s budget left")
+        return min(remaining, cap) if cap is not None else remaining
+
+
+# Unlimited stand-in so stages can always ask the current deadline
+NO_DEADLINE = Deadline(float("inf"))
+
+current_deadline = contextvars.ContextVar("current_deadline", default=NO_DEADLINE)
+
+
+def start_deadline(seconds):
+    """Give the current request or job a budget of `seconds` (None = unlimited)"""
+    deadline = Deadline(seconds) if seconds else NO_DEADLINE
+    current_deadline.set(deadline)
+    return deadline
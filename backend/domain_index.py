@@ -0,0 +1,173 @@
+# domain_index.py
+import os, sys, csv, json, mmap, time, struct, bisect, logging, threading
+from urllib.parse import urlparse
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"VNDI1\n"
+
+# What each reputation category tells us about a link before any upstream call
+CATEGORIES = {
+    "news": "Established news organization with public editorial standards",
+    "government": "Official government domain",
+    "reference": "Reference work or scientific publisher",
+    "social": "Social platform; the content itself is user-generated",
+    "satire": "Self-described satire publication; its stories are not literal news",
+    "unreliable": "Listed as a repeated source of false or misleading claims"
+}
+# Categories whose domains need no Safe Browsing lookup. Not "social": user
+# content and redirect hosts carry individual URLs that Safe Browsing flags.
+KNOWN_SAFE = {"news", "government", "reference"}
+# Categories whose homepages can be answered without reading them
+TRUSTED = {"news", "government", "reference"}
+
+
+def reverse_host(host):
+    """"www.bbc.co.uk" -> "uk.co.bbc.www", so a domain sorts next to its subdomains"""
+    return ".".join(reversed(host.lower().strip(".").split(".")))
+
+
+# -------------------------
+# Compiling
+# -------------------------
+# Layout: MAGIC, header length + JSON header, record count, one uint32
+# offset per record, then the records ("reversed-host\0category") sorted
+# by reversed host so lookups binary-search the mmap without loading it.
+def compile_index(source_path, index_path):
+    """Build the binary index from a "domain,category" CSV; written atomically"""
+    entries = {}
+    with open(source_path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#") or len(row) < 2:
+                continue
+            domain, category = row[0].strip(), row[1].strip()
+            if category not in CATEGORIES:
+                raise ValueError(f"Unknown category {category!r} for {domain}")
+            entries[reverse_host(domain).encode()] = category.encode()
+
+    keys = sorted(entries)
+    header = json.dumps({"source": os.path.basename(source_path), "count": len(keys), "compiled_at": time.time()}).encode()
+    records, offsets, position = [], [], 0
+    for key in keys:
+        record = key + b"\0" + entries[key]
+        offsets.append(position)
+        records.append(record)
+        position += len(record)
+    offsets.append(position)
+
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(struct.pack("<I", len(keys)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(records))
+    os.replace(tmp, index_path)
+    return len(keys)
+
+
+# -------------------------
+# Lookups
+# -------------------------
+class MappedIndex:
+    """One compiled index file, memory-mapped read-only"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a domain index")
+        position = len(MAGIC)
+        header_length, = struct.unpack_from("<I", self.map, position)
+        self.header = json.loads(self.map[position + 4:position + 4 + header_length])
+        position += 4 + header_length
+        self.count, = struct.unpack_from("<I", self.map, position)
+        self.offsets_at = position + 4
+        self.records_at = self.offsets_at + 4 * (self.count + 1)
+        self.mtime = os.stat(path).st_mtime
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        """Reversed host of record i (lets bisect search the mapped file)"""
+        start, end = struct.unpack_from("<II", self.map, self.offsets_at + 4 * i)
+        record = self.map[self.records_at + start:self.records_at + end]
+        return record[:record.index(b"\0")]
+
+    def category(self, key):
+        i = bisect.bisect_left(self, key)
+        if i < self.count and self[i] == key:
+            start, end = struct.unpack_from("<II", self.map, self.offsets_at + 4 * i)
+            record = self.map[self.records_at + start:self.records_at + end]
+            return record[record.index(b"\0") + 1:].decode()
+        return None
+
+
+class DomainIndex:
+    """Reputation lookups by hostname, following edits to the source list without a restart.
+
+    The compiled file is rebuilt whenever the CSV is newer, and every
+    worker re-maps it once its mtime changes (checked at most every
+    `check_interval` seconds).
+    """
+
+    def __init__(self, source_path, index_path, check_interval=30):
+        self.source_path = source_path
+        self.index_path = index_path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.index = None
+        self.checked_at = 0
+        self.reload()
+
+    def reload(self):
+        """Recompile if the source changed, then map the current file"""
+        self.checked_at = time.monotonic()
+        try:
+            if os.path.exists(self.source_path) and (
+                not os.path.exists(self.index_path) or os.stat(self.source_path).st_mtime > os.stat(self.index_path).st_mtime
+            ):
+                count = compile_index(self.source_path, self.index_path)
+                log.info("Compiled domain index: %d domains", count)
+            if self.index is None or os.stat(self.index_path).st_mtime != self.index.mtime:
+                # Swap in whole; readers holding the old map keep using it
+                self.index = MappedIndex(self.index_path)
+        except (OSError, ValueError) as e:
+            log.warning("Domain index unavailable: %s", e)
+
+    def maybe_reload(self):
+        if time.monotonic() - self.checked_at >= self.check_interval and self.lock.acquire(blocking=False):
+            try:
+                self.reload()
+            finally:
+                self.lock.release()
+
+    def lookup(self, url):
+        """{"domain", "matched", "category", "evidence"} for the closest listed parent domain, or None"""
+        self.maybe_reload()
+        index = self.index
+        host = urlparse(url).hostname if "://" in url else url
+        if index is None or not host:
+            return None
+        labels = reverse_host(host).split(".")
+        # Longest suffix first: news.bbc.co.uk, then bbc.co.uk, co.uk, uk
+        for size in range(len(labels), 0, -1):
+            key = ".".join(labels[:size])
+            category = index.category(key.encode())
+            if category:
+                return {
+                    "domain": host.lower(),
+                    "matched": reverse_host(key),
+                    "category": category,
+                    "evidence": CATEGORIES.get(category, category)
+                }
+        return None
+
+
+if __name__ == "__main__":
+    # python domain_index.py data/domain_reputation.csv domain_reputation.idx
+    if len(sys.argv) != 3:
+        sys.exit("usage: domain_index.py SOURCE_CSV INDEX_PATH")
+    print(f"{compile_index(sys.argv[1], sys.argv[2])} domains written to {sys.argv[2]}")
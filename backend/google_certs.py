@@ -0,0 +1,104 @@
+# google_certs.py
+import os, re, time, logging, threading
+from types import SimpleNamespace
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+log = logging.getLogger(__name__)
+
+
+class CachedCertsRequest:
+    """google.auth transport that answers GETs for signing certs from a process-wide cache.
+
+    Pass it as the `request` of id_token.verify_oauth2_token: the cert
+    download is served from memory while fresh, the cache lifetime follows
+    the response's Cache-Control max-age (minus Age), and a background
+    thread refetches shortly before expiry so logins never wait on it.
+    Anything other than a cert GET goes straight to the pooled transport.
+    """
+
+    def __init__(self, make_transport, refresh_margin=0.1, default_max_age=3600, stale_grace=3600):
+        self.make_transport = make_transport
+        self.refresh_margin = refresh_margin
+        self.default_max_age = default_max_age
+        self.stale_grace = stale_grace
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.entries = {}
+        self.refresher_pid = None
+        self.transport_pid, self.transport = None, None
+
+    def pooled_transport(self):
+        # One keep-alive session per process (it must not cross a fork)
+        if self.transport_pid != os.getpid():
+            self.transport, self.transport_pid = self.make_transport(), os.getpid()
+        return self.transport
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if method != "GET" or body is not None:
+            return self.pooled_transport()(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        entry = self.entries.get(url)
+        now = time.time()
+        if entry and now < entry["expires_at"]:
+            return entry["response"]
+        try:
+            return self.refresh(url, timeout)
+        except Exception as e:
+            # Keys rotate slowly; a recently expired copy beats failing every login
+            if entry and now < entry["expires_at"] + self.stale_grace:
+                log.warning("Cert refresh failed, serving cached copy: %s", e)
+                return entry["response"]
+            raise
+
+    def refresh(self, url, timeout=None):
+        """Fetch url now and cache it for its max-age"""
+        response = self.pooled_transport()(url, method="GET", timeout=timeout or 10)
+        if response.status != 200:
+            # Let google.auth raise its usual error for a bad status
+            return response
+        cached = SimpleNamespace(status=response.status, headers=dict(response.headers), data=response.data)
+        max_age = self.max_age(cached.headers)
+        with self.lock:
+            self.entries[url] = {
+                "response": cached,
+                "expires_at": time.time() + max_age,
+                "refresh_at": time.time() + max_age * (1 - self.refresh_margin)
+            }
+            self.wake.notify()
+        self.start_refresher()
+        return cached
+
+    def max_age(self, headers):
+        lowered = {k.lower(): v for k, v in headers.items()}
+        match = MAX_AGE.search(lowered.get("cache-control", ""))
+        if not match:
+            return self.default_max_age
+        try:
+            age = int(lowered.get("age", 0))
+        except ValueError:
+            age = 0
+        return max(int(match.group(1)) - age, 60)
+
+    def start_refresher(self):
+        if self.refresher_pid == os.getpid():
+            return
+        with self.lock:
+            if self.refresher_pid != os.getpid():
+                self.refresher_pid = os.getpid()
+                threading.Thread(target=self.refresh_forever, name="cert-refresh", daemon=True).start()
+
+    def refresh_forever(self):
+        while True:
+            with self.lock:
+                due = min((e["refresh_at"], url) for url, e in self.entries.items())
+                delay = due[0] - time.time()
+                if delay > 0:
+                    self.wake.wait(delay)
+                    continue
+                # Push the next attempt out so a failing fetch is not retried in a tight loop
+                self.entries[due[1]]["refresh_at"] = time.time() + 60
+            try:
+                self.refresh(due[1])
+                log.info("Refreshed signing certs from %s", due[1])
+            except Exception as e:
+                log.warning("Background cert refresh failed: %s", e)
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+import os
+import metrics
+
+# Import app.py once in the master; forked workers then share its modules
+# copy-on-write instead of each paying the import cost
+preload_app = True
+
+# Threaded workers: a long SSE stream (/api/jobs/<id>/events) occupies one thread,
+# not the whole worker, and the worker keeps heartbeating so the arbiter does
+# not kill it (and its in-process job threads) at the 30s timeout
+worker_class = "gthread"
+# Also read by app.py to split GEMINI_CONCURRENCY between the workers
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+
+def on_starting(server):
+    # Per-worker metric snapshots from a previous run would inflate the totals
+    metrics.clear_metrics_dir()
+
+
+def when_ready(server):
+    # The app is already loaded (preload); pull in the heavy SDKs before any fork
+    import app
+    app.warm_imports()
+
+
+def post_fork(server, worker):
+    # Clients and connections must not cross a fork, so each worker builds its own
+    import app
+    app.start_warmup()
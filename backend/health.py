@@ -0,0 +1,98 @@
+# health.py
+import os, time, logging, threading
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+class ProbeFailed(Exception):
+    """Raised by a probe with a message that is safe to show on the public health endpoints"""
+
+
+def public_detail(e):
+    # Raw exception text can carry URLs with credentials; publish only its kind
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return type(e).__name__ + (f" (HTTP {status})" if status else "")
+
+
+class DependencyProbes:
+    """Background checks of upstream dependencies, read by /healthz and /readyz.
+
+    Each probe is a function that raises when its dependency is unavailable
+    and may return a short detail string. Only ProbeFailed messages and
+    exception class names are published; full errors go to the log. One
+    thread per process runs every probe at its own interval; readers only
+    look at the cached results, so a health check never costs an upstream
+    call.
+    """
+
+    def __init__(self):
+        self.probes = {}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def register(self, name, check, interval=60, timeout_factor=3):
+        """Run `check` every `interval` seconds; results older than timeout_factor intervals count as down"""
+        self.probes[name] = {"check": check, "interval": interval, "stale_after": interval * timeout_factor, "due": 0}
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                for probe in self.probes.values():
+                    probe["due"] = 0
+                threading.Thread(target=self.run_forever, name="health-probes", daemon=True).start()
+
+    def run_forever(self):
+        while True:
+            now = time.time()
+            for name, probe in self.probes.items():
+                if probe["due"] <= now:
+                    self.run(name, probe)
+                    probe["due"] = time.time() + probe["interval"]
+            next_due = min(probe["due"] for probe in self.probes.values())
+            time.sleep(max(0.5, next_due - time.time()))
+
+    def run(self, name, probe):
+        start = time.perf_counter()
+        try:
+            detail = probe["check"]()
+            ok = True
+        except ProbeFailed as e:
+            detail, ok = str(e)[:300], False
+        except Exception as e:
+            log.warning("Probe %s failed: %s", name, e)
+            detail, ok = public_detail(e), False
+        elapsed = time.perf_counter() - start
+        metrics.observe("verifynow_probe_seconds", elapsed, dependency=name, outcome="up" if ok else "down")
+        with self.lock:
+            self.results[name] = {
+                "ok": ok,
+                "detail": detail or ("available" if ok else "unavailable"),
+                "checked_at": time.time(),
+                "latency_ms": round(elapsed * 1000, 1)
+            }
+
+    def snapshot(self):
+        """{name: {"status": "up"|"down"|"unknown", ...}} from cached results"""
+        now = time.time()
+        with self.lock:
+            results = dict(self.results)
+        report = {}
+        for name, probe in self.probes.items():
+            result = results.get(name)
+            if result is None:
+                report[name] = {"status": "unknown", "detail": "Not checked yet"}
+                continue
+            age = now - result["checked_at"]
+            status = "up" if result["ok"] and age <= probe["stale_after"] else "down"
+            report[name] = {
+                "status": status,
+                "detail": result["detail"] if age <= probe["stale_after"] else "Probe result is stale",
+                "age_seconds": round(age, 1),
+                "latency_ms": result["latency_ms"]
+            }
+        return report
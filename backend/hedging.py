@@ -0,0 +1,95 @@
+# hedging.py
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError
+import metrics
+
+
+class Hedger:
+    """Races a second request against a slow first one.
+
+    The hedge fires once the primary has run longer than the running
+    `percentile` latency of its model. Each hedgeable call earns `max_rate`
+    of a hedge, and each hedge spends one, so hedges stay near `max_rate`
+    of calls however slow the upstream gets.
+    """
+
+    def __init__(self, percentile=0.9, max_rate=0.1, default_delay=4.0, min_samples=20, window=200, workers=16):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.credit = 0.0
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+
+    def record(self, model, seconds):
+        with self.lock:
+            self.samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def delay(self, model):
+        """Seconds to wait for `model` before hedging"""
+        with self.lock:
+            samples = sorted(self.samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return samples[min(int(len(samples) * self.percentile), len(samples) - 1)]
+
+    def spend(self):
+        with self.lock:
+            if self.credit >= 1:
+                self.credit -= 1
+                return True
+            return False
+
+    def refund(self):
+        with self.lock:
+            self.credit += 1
+
+    def run(self, primary, alternate, delay, valid=None, admit=None):
+        """First valid result of primary(cancelled) and, if it is slow, alternate(cancelled).
+
+        `cancelled` is an Event set once a winner is chosen; callables should
+        stop trying further models when it is set. A call already in flight
+        cannot be aborted, so its late answer is simply dropped. `admit()`
+        reserves capacity for the hedge; when it returns False the hedge is
+        not sent and the primary is awaited alone.
+        """
+        with self.lock:
+            self.credit = min(self.credit + self.max_rate, 1 / max(self.max_rate, 1e-6))
+        cancelled = threading.Event()
+        first = self.pool.submit(primary, cancelled)
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+        if alternate is None or not self.spend():
+            return first.result()
+        if admit is not None and not admit():
+            self.refund()
+            metrics.inc("verifynow_hedges_skipped_total")
+            return first.result()
+
+        second = self.pool.submit(alternate, cancelled)
+        pending, fallback, error = {first, second}, None, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if valid is None or valid(result):
+                    cancelled.set()
+                    metrics.inc("verifynow_hedges_total", winner="hedge" if future is second else "primary")
+                    return result
+                if fallback is None:
+                    fallback = result
+        cancelled.set()
+        metrics.inc("verifynow_hedges_total", winner="none")
+        if fallback is not None:
+            return fallback
+        raise error
@@ -0,0 +1,57 @@
+# history_export.py
+import io, csv, json, zlib
+
+EXPORT_COLUMNS = ["id", "type", "content", "verdict", "summary", "proofs", "confidence", "safety_check", "created_at"]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps({column: row.get(column) for column in EXPORT_COLUMNS}, ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows):
+    # One reusable buffer, drained after every row
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row.get(column)) if column in ("proofs", "safety_check") else row.get(column)
+            for column in EXPORT_COLUMNS
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_chunks(rows, fmt, compress=False, chunk_size=64 * 1024):
+    """Encode history rows as NDJSON or CSV byte chunks, optionally gzipped.
+
+    Lines are batched into ~chunk_size writes so memory stays flat however
+    many rows the iterator yields.
+    """
+    lines = csv_lines(rows) if fmt == "csv" else ndjson_lines(rows)
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            block = b"".join(pending)
+            pending, size = [], 0
+            block = gzip.compress(block) if gzip else block
+            if block:
+                yield block
+
+    block = b"".join(pending)
+    if gzip:
+        block = gzip.compress(block) + gzip.flush()
+    if block:
+        yield block
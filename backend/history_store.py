@@ -0,0 +1,427 @@
+# history_store.py
+import os, re, json, sqlite3, logging, threading, datetime
+from sqlitedb import connect_sqlite
+
+log = logging.getLogger(__name__)
+
+# -------------------------
+# Storage interface
+# -------------------------
+class HistoryStore:
+    """Interface for verification history persistence"""
+
+    def save(self, record):
+        """Persist one history row, return True on success"""
+        raise NotImplementedError
+
+    def recent(self, user_id, limit=50):
+        """Return a user's most recent rows, newest first"""
+        raise NotImplementedError
+
+    def page(self, user_id, limit, after=None):
+        """Keyset page of a user's rows, newest first.
+
+        `after` is the (created_at, id) of the last row of the previous page.
+        """
+        raise NotImplementedError
+
+    def iter_all(self, user_id, page_size=500):
+        """Yield every row for a user, one page in memory at a time"""
+        after = None
+        while True:
+            rows = self.page(user_id, page_size, after)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+
+    def search(self, user_id, query, limit=20, offset=0):
+        """Full-text search over content, summary and proofs, best match first.
+
+        Each returned row carries extra `rank` (higher is better) and `snippet` keys.
+        """
+        raise NotImplementedError
+
+    def stats(self, scope, days=30):
+        """Materialized counters for a user id, or GLOBAL_SCOPE for everyone"""
+        raise NotImplementedError
+
+    def ping(self):
+        """Cheapest round trip to the backend; raises if it is unreachable"""
+        raise NotImplementedError
+
+
+GLOBAL_SCOPE = "*"
+CONFIDENCE_BUCKETS = 11  # 0-9, 10-19, ..., 90-99, 100
+
+
+def summarize_stats(scope, totals, daily, confidence):
+    """Shape raw counter rows into the /api/verification-stats payload"""
+    by_verdict, by_type = {}, {}
+    count = confidence_sum = 0
+    for row in totals:
+        by_verdict[row["verdict"]] = by_verdict.get(row["verdict"], 0) + row["count"]
+        by_type[row["type"]] = by_type.get(row["type"], 0) + row["count"]
+        count += row["count"]
+        confidence_sum += row["confidence_sum"]
+
+    buckets = [0] * CONFIDENCE_BUCKETS
+    for row in confidence:
+        buckets[row["bucket"]] += row["count"]
+
+    return {
+        "scope": "global" if scope == GLOBAL_SCOPE else "user",
+        "total": count,
+        "byVerdict": by_verdict,
+        "byType": by_type,
+        "daily": [
+            {"date": row["day"], "type": row["type"], "verdict": row["verdict"], "count": row["count"]}
+            for row in sorted(daily, key=lambda r: r["day"])
+        ],
+        "confidence": {
+            "mean": round(confidence_sum / count, 1) if count else 0,
+            "buckets": [
+                {"min": i * 10, "max": min(i * 10 + 9, 100), "count": buckets[i]}
+                for i in range(CONFIDENCE_BUCKETS)
+            ]
+        }
+    }
+
+
+def stats_since(days):
+    return (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days - 1)).date().isoformat()
+
+
+# -------------------------
+# Supabase backend
+# -------------------------
+class SupabaseHistoryStore(HistoryStore):
+    """History stored in the Supabase `verification_history` table"""
+
+    def __init__(self, url, key):
+        from supabase import create_client
+        from supabase.lib.client_options import ClientOptions
+
+        # One client per process instead of one per call; bounded so a slow
+        # Supabase cannot hold a worker past the request deadline
+        timeout = float(os.getenv("SUPABASE_TIMEOUT", 5))
+        self.client = create_client(url, key, options=ClientOptions(postgrest_client_timeout=timeout))
+
+    def table(self):
+        return self.client.table("verification_history")
+
+    def save(self, record):
+        response = self.table().insert(record).execute()
+        if hasattr(response, 'data') and response.data:
+            return True
+        log.error("Failed to save history: %s", getattr(response, "status_code", "no data returned"))
+        return False
+
+    def recent(self, user_id, limit=50):
+        response = self.table()\
+            .select("*")\
+            .eq("user_id", user_id)\
+            .order("created_at", desc=True)\
+            .limit(limit)\
+            .execute()
+        return response.data if hasattr(response, 'data') else []
+
+    def page(self, user_id, limit, after=None):
+        query = self.table()\
+            .select("*")\
+            .eq("user_id", user_id)
+        if after:
+            created_at, row_id = after
+            query = query.or_(f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})")
+        response = query\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .limit(limit)\
+            .execute()
+        return response.data if hasattr(response, 'data') else []
+
+    def search(self, user_id, query, limit=20, offset=0):
+        # Ranking and snippets happen in Postgres, see sql/verification_history_search.sql
+        response = self.client.rpc("search_verification_history", {
+            "p_user_id": user_id,
+            "p_query": query,
+            "p_limit": limit,
+            "p_offset": offset
+        }).execute()
+        return response.data if hasattr(response, 'data') else []
+
+    def stats(self, scope, days=30):
+        # Counters are maintained by a trigger, see sql/verification_stats.sql
+        def rows(table, query=lambda q: q):
+            response = query(self.client.table(table).select("*").eq("scope", scope)).execute()
+            return response.data if hasattr(response, 'data') else []
+
+        return summarize_stats(
+            scope,
+            rows("verification_stats_totals"),
+            rows("verification_stats_daily", lambda q: q.gte("day", stats_since(days))),
+            rows("verification_stats_confidence")
+        )
+
+    def ping(self):
+        self.table().select("id").limit(1).execute()
+
+
+# -------------------------
+# SQLite backend
+# -------------------------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verification_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    type TEXT,
+    content TEXT,
+    verdict TEXT,
+    summary TEXT,
+    proofs TEXT,
+    confidence INTEGER,
+    safety_check TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verification_history_user_created
+    ON verification_history (user_id, created_at DESC, id DESC);
+"""
+
+# External-content FTS5 index kept in sync by triggers, so rows are only stored once
+SQLITE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS verification_history_fts USING fts5(
+    content, summary, proofs,
+    content='verification_history', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS verification_history_ai AFTER INSERT ON verification_history BEGIN
+    INSERT INTO verification_history_fts (rowid, content, summary, proofs)
+    VALUES (new.id, new.content, new.summary, new.proofs);
+END;
+CREATE TRIGGER IF NOT EXISTS verification_history_ad AFTER DELETE ON verification_history BEGIN
+    INSERT INTO verification_history_fts (verification_history_fts, rowid, content, summary, proofs)
+    VALUES ('delete', old.id, old.content, old.summary, old.proofs);
+END;
+CREATE TRIGGER IF NOT EXISTS verification_history_au AFTER UPDATE ON verification_history BEGIN
+    INSERT INTO verification_history_fts (verification_history_fts, rowid, content, summary, proofs)
+    VALUES ('delete', old.id, old.content, old.summary, old.proofs);
+    INSERT INTO verification_history_fts (rowid, content, summary, proofs)
+    VALUES (new.id, new.content, new.summary, new.proofs);
+END;
+INSERT INTO verification_history_fts (verification_history_fts) VALUES ('rebuild');
+"""
+
+# Counters for /api/verification-stats, bumped by a trigger on every insert for
+# both the row's user and GLOBAL_SCOPE. The one-off backfill runs under an
+# exclusive lock and records a marker so concurrent workers never double count.
+SQLITE_STATS_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS verification_stats_totals (
+    scope TEXT NOT NULL, type TEXT NOT NULL, verdict TEXT NOT NULL,
+    count INTEGER NOT NULL, confidence_sum INTEGER NOT NULL,
+    PRIMARY KEY (scope, type, verdict)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS verification_stats_daily (
+    scope TEXT NOT NULL, day TEXT NOT NULL, type TEXT NOT NULL, verdict TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (scope, day, type, verdict)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS verification_stats_confidence (
+    scope TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (scope, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS verification_stats_meta (key TEXT PRIMARY KEY);
+
+CREATE TEMP VIEW IF NOT EXISTS stats_backfill_source AS
+SELECT scope, type, verdict, day, confidence FROM (
+    SELECT user_id AS scope, coalesce(type, '') AS type, coalesce(verdict, 'Unverified') AS verdict,
+           substr(created_at, 1, 10) AS day,
+           min(max(CAST(coalesce(confidence, 0) AS INTEGER), 0), 100) AS confidence
+    FROM verification_history
+    UNION ALL
+    SELECT '*', coalesce(type, ''), coalesce(verdict, 'Unverified'), substr(created_at, 1, 10),
+           min(max(CAST(coalesce(confidence, 0) AS INTEGER), 0), 100)
+    FROM verification_history
+)
+WHERE NOT EXISTS (SELECT 1 FROM verification_stats_meta WHERE key = 'backfilled');
+
+INSERT INTO verification_stats_totals
+SELECT scope, type, verdict, count(*), sum(confidence) FROM stats_backfill_source GROUP BY 1, 2, 3;
+INSERT INTO verification_stats_daily
+SELECT scope, day, type, verdict, count(*) FROM stats_backfill_source GROUP BY 1, 2, 3, 4;
+INSERT INTO verification_stats_confidence
+SELECT scope, confidence / 10, count(*) FROM stats_backfill_source GROUP BY 1, 2;
+INSERT OR IGNORE INTO verification_stats_meta (key) VALUES ('backfilled');
+DROP VIEW stats_backfill_source;
+
+CREATE TRIGGER IF NOT EXISTS verification_history_stats AFTER INSERT ON verification_history BEGIN
+    INSERT INTO verification_stats_totals (scope, type, verdict, count, confidence_sum)
+    SELECT scope, coalesce(new.type, ''), coalesce(new.verdict, 'Unverified'), 1,
+           min(max(CAST(coalesce(new.confidence, 0) AS INTEGER), 0), 100)
+    FROM (SELECT new.user_id AS scope UNION ALL SELECT '*') WHERE true
+    ON CONFLICT (scope, type, verdict) DO UPDATE
+        SET count = count + 1, confidence_sum = confidence_sum + excluded.confidence_sum;
+    INSERT INTO verification_stats_daily (scope, day, type, verdict, count)
+    SELECT scope, substr(new.created_at, 1, 10), coalesce(new.type, ''), coalesce(new.verdict, 'Unverified'), 1
+    FROM (SELECT new.user_id AS scope UNION ALL SELECT '*') WHERE true
+    ON CONFLICT (scope, day, type, verdict) DO UPDATE SET count = count + 1;
+    INSERT INTO verification_stats_confidence (scope, bucket, count)
+    SELECT scope, min(max(CAST(coalesce(new.confidence, 0) AS INTEGER), 0), 100) / 10, 1
+    FROM (SELECT new.user_id AS scope UNION ALL SELECT '*') WHERE true
+    ON CONFLICT (scope, bucket) DO UPDATE SET count = count + 1;
+END;
+COMMIT;
+"""
+
+# Fixed statement text so sqlite3's per-connection statement cache reuses
+# the compiled statements instead of re-preparing them on every call
+INSERT_SQL = """
+INSERT INTO verification_history
+    (user_id, type, content, verdict, summary, proofs, confidence, safety_check, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+RECENT_SQL = """
+SELECT * FROM verification_history
+WHERE user_id = ?
+ORDER BY created_at DESC, id DESC
+LIMIT ?
+"""
+PAGE_FIRST_SQL = RECENT_SQL
+PAGE_AFTER_SQL = """
+SELECT * FROM verification_history
+WHERE user_id = ? AND (created_at, id) < (?, ?)
+ORDER BY created_at DESC, id DESC
+LIMIT ?
+"""
+SEARCH_SQL = """
+SELECT h.*,
+       -bm25(verification_history_fts, 1.0, 2.0, 0.5) AS rank,
+       snippet(verification_history_fts, -1, '[', ']', '…', 12) AS snippet
+FROM verification_history_fts
+JOIN verification_history h ON h.id = verification_history_fts.rowid
+WHERE verification_history_fts MATCH ? AND h.user_id = ?
+ORDER BY rank DESC
+LIMIT ? OFFSET ?
+"""
+STATS_TOTALS_SQL = "SELECT * FROM verification_stats_totals WHERE scope = ?"
+STATS_DAILY_SQL = "SELECT * FROM verification_stats_daily WHERE scope = ? AND day >= ?"
+STATS_CONFIDENCE_SQL = "SELECT * FROM verification_stats_confidence WHERE scope = ?"
+
+JSON_COLUMNS = ("proofs", "safety_check")
+
+
+def fts_query(query):
+    """Turn free text into an FTS5 query: every word must match, last word as a prefix"""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    quoted = ['"' + term + '"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def utc_now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """History stored in a local SQLite file in WAL mode"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.migrate(self.connection())
+
+    def connection(self):
+        return connect_sqlite(self.path, self.local, row_factory=sqlite3.Row, cached_statements=128)
+
+    def migrate(self, conn):
+        # Every statement is idempotent, so workers racing on startup are harmless
+        conn.executescript(SQLITE_SCHEMA)
+        has_fts = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'verification_history_fts'"
+        ).fetchone()
+        if not has_fts:
+            # Also backfills rows written before search existed
+            conn.executescript(SQLITE_FTS_SCHEMA)
+        conn.executescript(SQLITE_STATS_SCHEMA)
+
+    def row_to_dict(self, row):
+        item = dict(row)
+        for column in JSON_COLUMNS:
+            if item.get(column):
+                item[column] = json.loads(item[column])
+        return item
+
+    def save(self, record):
+        conn = self.connection()
+        with conn:
+            conn.execute(INSERT_SQL, (
+                record["user_id"],
+                record.get("type"),
+                record.get("content", ""),
+                record.get("verdict", "Unverified"),
+                record.get("summary", ""),
+                json.dumps(record.get("proofs", [])),
+                record.get("confidence", 0),
+                json.dumps(record.get("safety_check", {})),
+                record.get("created_at") or utc_now_iso()
+            ))
+        return True
+
+    def recent(self, user_id, limit=50):
+        rows = self.connection().execute(RECENT_SQL, (user_id, limit)).fetchall()
+        return [self.row_to_dict(row) for row in rows]
+
+    def page(self, user_id, limit, after=None):
+        if after:
+            rows = self.connection().execute(PAGE_AFTER_SQL, (user_id, after[0], after[1], limit)).fetchall()
+        else:
+            rows = self.connection().execute(PAGE_FIRST_SQL, (user_id, limit)).fetchall()
+        return [self.row_to_dict(row) for row in rows]
+
+    def search(self, user_id, query, limit=20, offset=0):
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self.connection().execute(SEARCH_SQL, (match, user_id, limit, offset)).fetchall()
+        return [self.row_to_dict(row) for row in rows]
+
+    def stats(self, scope, days=30):
+        conn = self.connection()
+        return summarize_stats(
+            scope,
+            conn.execute(STATS_TOTALS_SQL, (scope,)).fetchall(),
+            conn.execute(STATS_DAILY_SQL, (scope, stats_since(days))).fetchall(),
+            conn.execute(STATS_CONFIDENCE_SQL, (scope,)).fetchall()
+        )
+
+    def ping(self):
+        self.connection().execute("SELECT 1 FROM verification_history LIMIT 1").fetchall()
+
+
+# -------------------------
+# Backend selection
+# -------------------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_history_store():
+    """Build the backend named by HISTORY_BACKEND (supabase or sqlite)"""
+    backend = os.getenv("HISTORY_BACKEND", "supabase").lower()
+    if backend == "sqlite":
+        return SQLiteHistoryStore(os.getenv("HISTORY_SQLITE_PATH", "verification_history.db"))
+    if backend == "supabase":
+        return SupabaseHistoryStore(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    raise ValueError(f"Unknown HISTORY_BACKEND: {backend}")
+
+
+def get_history_store():
+    """Process-wide history store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_history_store()
+    return _store
@@ -0,0 +1,361 @@
+# image_meta.py
+import re, zlib, struct
+
+# Metadata lives in segments ahead of the pixel data; never read more than this of them
+MAX_HEADER_BYTES = 2 * 1024 * 1024
+
+EXIF_TAGS = {0x010F: "make", 0x0110: "model", 0x0131: "software", 0x0132: "modified"}
+EXIF_SUB_TAGS = {0x9003: "captured"}
+EXIF_IFD_POINTER = 0x8769
+
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_HISTORY = re.compile(r"<xmpMM:History>(.*?)</xmpMM:History>", re.DOTALL)
+
+# IPTC digital source types that mean none of the pixels came from a camera
+AI_SOURCE_TYPES = {
+    "trainedAlgorithmicMedia": ("Fake", 85, "was generated by an AI model"),
+    "algorithmicMedia": ("Fake", 80, "was generated algorithmically")
+}
+# Partly generated (e.g. generative fill): worth telling the model, not a verdict on its own
+AI_EDIT_SOURCE_TYPES = {"compositeWithTrainedAlgorithmicMedia": "contains AI-generated elements"}
+
+
+def tool_pattern(*names):
+    # Whole product names only: "imagen" must not match "Imagenomic Portraiture"
+    return re.compile(r"\b(" + "|".join(names) + r")\b", re.IGNORECASE)
+
+
+# Tools that only ever produce whole synthetic images
+GENERATORS = tool_pattern(r"dall[-·]?e", "chatgpt", "openai", "midjourney", "stable diffusion", "comfyui", "novelai", "imagen")
+# Generative features inside ordinary editors
+GENERATIVE_EDITS = tool_pattern("firefly", r"generative (?:fill|expand)")
+EDITORS = tool_pattern("photoshop", "lightroom", "gimp", "affinity photo", "pixelmator", "photopea", "snapseed", "facetune", "picsart", "canva")
+
+
+def read_metadata(path):
+    """EXIF, XMP and C2PA hints from a JPEG, PNG or WebP header, without decoding pixels.
+
+    Returns a dict of whatever was found (possibly empty); unreadable or
+    unsupported files are not an error.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(12)
+            f.seek(0)
+            if head[:2] == b"\xff\xd8":
+                raw = jpeg_segments(f)
+            elif head[:8] == b"\x89PNG\r\n\x1a\n":
+                raw = png_chunks(f)
+            elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                raw = webp_chunks(f)
+            else:
+                return {}
+            return summarize(raw)
+    except (OSError, ValueError, struct.error, zlib.error):
+        return {}
+
+
+# -------------------------
+# Container walkers
+# -------------------------
+# Each returns {"format", "exif": bytes, "xmp": str, "c2pa": bytes, "text": {keyword: value}}
+# and seeks past everything else.
+def jpeg_segments(f):
+    raw = {"format": "jpeg", "c2pa": b""}
+    f.seek(2)
+    while f.tell() < MAX_HEADER_BYTES:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF or marker[1] in (0xDA, 0xD9):
+            # Start of scan (pixel data) or end of image
+            break
+        if marker[1] == 0xFF:
+            # Fill byte before the real marker
+            f.seek(-1, 1)
+            continue
+        if 0xD0 <= marker[1] <= 0xD7 or marker[1] == 0x01:
+            continue
+        length = struct.unpack(">H", f.read(2))[0] - 2
+        if marker[1] in (0xE1, 0xEB):
+            data = f.read(length)
+            if marker[1] == 0xEB and data[:2] == b"JP":
+                # JUMBF boxes split across APP11 segments; scanning the concatenation is enough
+                raw["c2pa"] += data[8:]
+            elif data.startswith(b"Exif\x00\x00"):
+                raw["exif"] = data[6:]
+            elif data.startswith(XMP_HEADER):
+                raw["xmp"] = data[len(XMP_HEADER):].decode("utf-8", "replace")
+        else:
+            f.seek(length, 1)
+    return raw
+
+
+def png_chunks(f):
+    raw = {"format": "png", "c2pa": b"", "text": {}}
+    f.seek(8)
+    while f.tell() < MAX_HEADER_BYTES:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, kind = struct.unpack(">I4s", header)
+        if kind in (b"IDAT", b"IEND"):
+            break
+        if kind in (b"eXIf", b"caBX", b"iTXt", b"tEXt"):
+            data = f.read(length)
+            f.seek(4, 1)
+        else:
+            f.seek(length + 4, 1)
+            continue
+        if kind == b"eXIf":
+            raw["exif"] = data
+        elif kind == b"caBX":
+            raw["c2pa"] += data
+        elif kind == b"tEXt":
+            keyword, _, value = data.partition(b"\x00")
+            raw["text"][keyword.decode("latin-1")] = value.decode("latin-1")
+        else:
+            keyword, _, rest = data.partition(b"\x00")
+            compressed, rest = rest[:1] == b"\x01", rest[2:]
+            # Language tag and translated keyword precede the text
+            value = rest.split(b"\x00", 2)[-1]
+            if compressed:
+                value = zlib.decompressobj().decompress(value, 1024 * 1024)
+            value = value.decode("utf-8", "replace")
+            if keyword == b"XML:com.adobe.xmp":
+                raw["xmp"] = value
+            else:
+                raw["text"][keyword.decode("latin-1")] = value
+    return raw
+
+
+def webp_chunks(f):
+    raw = {"format": "webp", "c2pa": b""}
+    f.seek(12)
+    for _ in range(64):
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        kind, length = struct.unpack("<4sI", header)
+        padded = length + (length & 1)
+        if kind in (b"EXIF", b"XMP ", b"C2PA") and length <= MAX_HEADER_BYTES:
+            data = f.read(length)
+            f.seek(padded - length, 1)
+            if kind == b"EXIF":
+                raw["exif"] = data[6:] if data.startswith(b"Exif\x00\x00") else data
+            elif kind == b"XMP ":
+                raw["xmp"] = data.decode("utf-8", "replace")
+            else:
+                raw["c2pa"] += data
+        else:
+            # Image data is skipped, not read
+            f.seek(padded, 1)
+    return raw
+
+
+# -------------------------
+# Payload parsers
+# -------------------------
+def parse_exif(data):
+    """{field: str} for the ASCII tags in EXIF_TAGS and EXIF_SUB_TAGS"""
+    fields = {}
+    order = {b"II": "<", b"MM": ">"}.get(data[:2])
+    if not order:
+        return fields
+    try:
+        sub_ifd = read_ifd(data, order, struct.unpack_from(order + "I", data, 4)[0], EXIF_TAGS, fields)
+        if sub_ifd:
+            read_ifd(data, order, sub_ifd, EXIF_SUB_TAGS, fields)
+    except struct.error:
+        pass
+    return fields
+
+
+def read_ifd(data, order, offset, tags, fields):
+    """Fill fields from one IFD; returns the Exif sub-IFD offset if present"""
+    sub_ifd = None
+    count = struct.unpack_from(order + "H", data, offset)[0]
+    for i in range(min(count, 512)):
+        tag, kind, n, value = struct.unpack_from(order + "HHII", data, offset + 2 + i * 12)
+        if tag == EXIF_IFD_POINTER:
+            sub_ifd = value
+        elif tag in tags and kind == 2:
+            # ASCII values of four bytes or less sit in the entry itself
+            start = offset + 2 + i * 12 + 8 if n <= 4 else value
+            text = data[start:start + n].split(b"\x00")[0].decode("utf-8", "replace").strip()
+            if text:
+                fields[tags[tag]] = text
+    return sub_ifd
+
+
+def xmp_value(xml, name):
+    match = re.search(name + r'(?:\s*=\s*"([^"]*)"|>\s*([^<]+?)\s*<)', xml)
+    if not match:
+        return None
+    return (match.group(1) if match.group(1) is not None else match.group(2)).strip()
+
+
+def xmp_history(xml):
+    """[{"action", "agent", "when"}] from xmpMM:History"""
+    match = XMP_HISTORY.search(xml)
+    if not match:
+        return []
+    events = []
+    for item in re.split(r"<rdf:li\b", match.group(1))[1:]:
+        event = {key: xmp_value(item, "stEvt:" + field) for key, field in (("action", "action"), ("agent", "softwareAgent"), ("when", "when"))}
+        if event["action"]:
+            events.append(event)
+    return events
+
+
+def cbor_texts(blob, key):
+    """Text values stored under a text key anywhere in CBOR-encoded C2PA claims"""
+    values = []
+    encoded = bytes([0x60 + len(key)]) + key
+    start = blob.find(encoded)
+    while start != -1:
+        at = start + len(encoded)
+        head = blob[at:at + 1]
+        if head and 0x60 <= head[0] <= 0x77:
+            length, at = head[0] - 0x60, at + 1
+        elif head == b"\x78" and at + 1 < len(blob):
+            length, at = blob[at + 1], at + 2
+        else:
+            length = None
+        if length:
+            values.append(blob[at:at + length].decode("utf-8", "replace"))
+        start = blob.find(encoded, at)
+    return values
+
+
+def source_type(value):
+    # IPTC terms are URIs; the last path segment is the term itself
+    return value.rstrip("/").rsplit("/", 1)[-1] if value else None
+
+
+def exif_time(value):
+    # "2024:05:01 10:00:00" -> "2024-05-01T10:00:00"
+    if value and re.match(r"\d{4}:\d\d:\d\d \d\d:\d\d:\d\d", value):
+        return value[:10].replace(":", "-") + "T" + value[11:19]
+    return value
+
+
+# -------------------------
+# Summary and assessment
+# -------------------------
+def summarize(raw):
+    exif = parse_exif(raw["exif"]) if raw.get("exif") else {}
+    xmp = raw.get("xmp") or ""
+    text = raw.get("text") or {}
+    meta = {"format": raw["format"]}
+
+    camera = " ".join(part for part in (exif.get("make"), exif.get("model")) if part)
+    if camera:
+        meta["camera"] = camera
+    captured = exif_time(exif.get("captured")) or xmp_value(xmp, "photoshop:DateCreated") or xmp_value(xmp, "xmp:CreateDate")
+    if captured:
+        meta["captured"] = captured
+    modified = exif_time(exif.get("modified")) or xmp_value(xmp, "xmp:ModifyDate")
+    if modified:
+        meta["modified"] = modified
+
+    history = xmp_history(xmp)
+    software = [exif.get("software"), xmp_value(xmp, "xmp:CreatorTool"), text.get("Software")]
+    software += [event["agent"] for event in history]
+    if "Steps:" in text.get("parameters", ""):
+        software.append("Stable Diffusion web UI")
+    if "workflow" in text:
+        software.append("ComfyUI")
+    software = list(dict.fromkeys(s for s in software if s))
+    if software:
+        meta["software"] = software
+    if history:
+        meta["edits"] = [
+            " ".join(part for part in (event["action"], f"by {event['agent']}" if event["agent"] else None, f"at {event['when']}" if event["when"] else None) if part)
+            for event in history[-10:]
+        ]
+
+    xmp_source = source_type(xmp_value(xmp, "Iptc4xmpExt:DigitalSourceType"))
+    if xmp_source:
+        meta["source_type"] = xmp_source
+
+    blob = raw.get("c2pa") or b""
+    if b"c2pa" in blob:
+        credentials = {
+            "generator": (cbor_texts(blob, b"claim_generator") or [None])[0],
+            "actions": list(dict.fromkeys(cbor_texts(blob, b"action"))),
+            "agents": list(dict.fromkeys(cbor_texts(blob, b"softwareAgent") + cbor_texts(blob, b"name"))),
+            "source_type": source_type((cbor_texts(blob, b"digitalSourceType") or [None])[0])
+        }
+        meta["credentials"] = {key: value for key, value in credentials.items() if value}
+    return meta
+
+
+def matching_tool(names, pattern):
+    """(name, matched product in lower case) for the first name the pattern finds, else (None, None)"""
+    for name in names:
+        match = pattern.search(name)
+        if match:
+            return name, match.group(1).lower()
+    return None, None
+
+
+def assess(meta):
+    """(finding, hints) for a read_metadata() result.
+
+    finding is {"verdict", "summary", "proofs", "confidence"} when the
+    metadata alone settles the question, else None; hints are the facts
+    worth handing to the model either way.
+    """
+    hints = []
+    if meta.get("captured"):
+        hints.append(f"Captured {meta['captured']}" + (f" on {meta['camera']}" if meta.get("camera") else ""))
+    elif meta.get("camera"):
+        hints.append(f"Camera: {meta['camera']}")
+    if meta.get("software"):
+        hints.append("Software: " + ", ".join(meta["software"]))
+    if meta.get("edits"):
+        hints.append("Edit history: " + "; ".join(meta["edits"]))
+    credentials = meta.get("credentials")
+    if credentials is not None:
+        issued_by = f" issued by {credentials['generator']}" if credentials.get("generator") else ""
+        actions = f" recording {', '.join(credentials['actions'])}" if credentials.get("actions") else ""
+        hints.append(f"Content credentials (C2PA){issued_by}{actions}; signature not validated")
+
+    source = meta.get("source_type") or (credentials or {}).get("source_type")
+    credentials_names = [(credentials or {}).get("generator") or ""] + (credentials or {}).get("agents", [])
+    if source in AI_EDIT_SOURCE_TYPES:
+        hints.append(f"Digital source type: {source} ({AI_EDIT_SOURCE_TYPES[source]})")
+    generative_edit, _ = matching_tool(meta.get("software", []) + credentials_names, GENERATIVE_EDITS)
+    if generative_edit:
+        hints.append(f"Generative AI editing tool used: {generative_edit}")
+
+    if source in AI_SOURCE_TYPES:
+        verdict, confidence, what = AI_SOURCE_TYPES[source]
+        return {
+            "verdict": verdict,
+            "summary": f"The image's embedded metadata declares that it {what} ({source}).",
+            "proofs": hints + [f"Digital source type: {source}"],
+            "confidence": confidence
+        }, hints
+
+    generator, _ = matching_tool(meta.get("software", []) + credentials_names, GENERATORS)
+    if generator:
+        return {
+            "verdict": "Fake",
+            "summary": f"The image's embedded metadata names the image generator {generator}; it is not a photograph.",
+            "proofs": hints,
+            "confidence": 80
+        }, hints
+
+    if credentials is not None:
+        # An editor that left its mark outside the signed manifest means the credentials no longer describe the file
+        recorded = {tool.lower() for name in credentials_names for tool in EDITORS.findall(name)}
+        editor, tool = matching_tool(meta.get("software", []), EDITORS)
+        if editor and tool not in recorded:
+            return {
+                "verdict": "Misleading",
+                "summary": f"The image was edited with {editor}, which its content credentials do not record; it has been altered since they were issued.",
+                "proofs": hints,
+                "confidence": 75
+            }, hints
+
+    return None, hints
@@ -0,0 +1,168 @@
+# jobs.py
+import json, time, uuid, queue, sqlite3, logging, threading, itertools
+import logs
+import metrics
+from admission import Overloaded
+from deadline import start_deadline
+from sqlitedb import connect_sqlite
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("done", "failed")
+
+log = logging.getLogger(__name__)
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    http_status INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+"""
+
+
+class JobQueueFull(Exception):
+    """Raised when the pending queue is at capacity"""
+
+
+class JobQueue:
+    """Bounded, prioritized background worker pool for verification pipelines.
+
+    Jobs run in threads of the process that accepted them, while their state
+    lives in a shared SQLite file so any gunicorn worker can answer polls.
+    """
+
+    def __init__(self, path, runners, workers=2, max_pending=50, ttl=3600, stale_after=6 * 3600, deadline=None):
+        self.path = path
+        self.runners = runners
+        self.workers = workers
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.deadline = deadline
+        self.pending = queue.PriorityQueue(maxsize=max_pending)
+        self.sequence = itertools.count()
+        self.local = threading.local()
+        self.threads = []
+        self.start_lock = threading.Lock()
+        self.connection().executescript(JOBS_SCHEMA)
+
+    def connection(self):
+        return connect_sqlite(self.path, self.local, row_factory=sqlite3.Row)
+
+    def start(self):
+        # Threads are started on first use so they exist in each forked worker
+        if len(self.threads) >= self.workers:
+            return
+        with self.start_lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.work, name=f"job-worker-{len(self.threads)}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, user_id, kind, payload, priority="normal"):
+        """Queue a job and return its id immediately"""
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job type: {kind}")
+        self.start()
+        self.purge()
+
+        job_id = uuid.uuid4().hex
+        rank = PRIORITIES.get(priority, PRIORITIES["normal"])
+        now = time.time()
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, user_id, kind, priority, status, created_at, updated_at, expires_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, user_id, kind, rank, now, now, now + self.stale_after)
+            )
+        try:
+            self.pending.put_nowait((rank, next(self.sequence), job_id, user_id, kind, payload))
+        except queue.Full:
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            raise JobQueueFull("Job queue is full")
+        return job_id
+
+    def get(self, job_id, user_id):
+        """Job status for its owner, or None if unknown or expired"""
+        row = self.connection().execute(
+            "SELECT * FROM jobs WHERE id = ? AND user_id = ? AND expires_at > ?",
+            (job_id, user_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row["id"],
+            "type": row["kind"],
+            "status": row["status"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"]
+        }
+        if row["status"] in FINISHED:
+            job["httpStatus"] = row["http_status"]
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
+
+    def events(self, job_id, user_id, poll_interval=0.5, heartbeat=15, timeout=600):
+        """Yield the job each time its status changes, and None as a heartbeat"""
+        last_status, last_sent = None, time.time()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.get(job_id, user_id)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status, last_sent = job["status"], time.time()
+                yield job
+                if job["status"] in FINISHED:
+                    return
+            elif time.time() - last_sent >= heartbeat:
+                last_sent = time.time()
+                yield None
+            time.sleep(poll_interval)
+
+    def purge(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),))
+
+    def update(self, job_id, status, result=None, http_status=None):
+        now = time.time()
+        expires_at = now + (self.ttl if status in FINISHED else self.stale_after)
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, http_status = ?, updated_at = ?, expires_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, http_status, now, expires_at, job_id)
+            )
+
+    def work(self):
+        while True:
+            _, _, job_id, user_id, kind, payload = self.pending.get()
+            metrics.begin_request(f"job_{kind}")
+            logs.request_id.set(job_id)
+            start_deadline(self.deadline)
+            start = time.perf_counter()
+            try:
+                self.update(job_id, "running")
+                result, status = self.runners[kind](user_id, payload)
+                self.update(job_id, "done" if status < 400 else "failed", result, status)
+            except Overloaded as e:
+                self.update(job_id, "failed", {"message": str(e), "retryAfter": e.retry_after}, 503)
+            except Exception as e:
+                log.exception("Job failed")
+                self.update(job_id, "failed", {"message": f"Job failed: {e}"}, 500)
+            finally:
+                log.info("Job %s finished", kind, extra={
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "stages": metrics.stage_timings_ms()
+                })
+                self.pending.task_done()
@@ -0,0 +1,46 @@
+# lazy.py
+import time, logging, importlib, threading
+
+log = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Stands in for a heavy module until an attribute is first used.
+
+    The import (and optional `setup(module)`, e.g. configuring a client)
+    runs once, on first attribute access or an explicit load(). Setting an
+    attribute sets it on the real module, so tests can still patch through it.
+    """
+
+    def __init__(self, name, setup=None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_setup", setup)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._setup:
+                        self._setup(module)
+                    object.__setattr__(self, "_module", module)
+                    log.info("Loaded %s in %.0fms", self._name, (time.perf_counter() - start) * 1000)
+        return module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+
+    def __repr__(self):
+        return f"<lazy module {self._name}{'' if self.loaded else ' (not loaded)'}>"
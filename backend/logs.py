@@ -0,0 +1,145 @@
+# logs.py
+import os, re, sys, json, uuid, queue, atexit, random, logging, threading, contextvars
+from logging.handlers import QueueHandler, QueueListener
+import metrics
+from admission import current_user
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Extra fields that may carry user content; only their size is written
+REDACTED_FIELDS = {"text", "content", "ocr_text", "page_text", "prompt", "query", "token", "email"}
+SCRUB_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*"), "<jwt>"),
+    (re.compile(r"(?i)bearer\s+\S+"), "Bearer <token>"),
+    (re.compile(r"([?&](?:key|api_key|token)=)[^&\s]+"), r"\1<redacted>")
+]
+
+REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+# Attributes every LogRecord has; anything else came in through `extra`
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample"}
+
+
+def new_request_id(header=None):
+    """Adopt a sane incoming X-Request-Id, else mint one, and bind it to this context"""
+    rid = header if header and REQUEST_ID.fullmatch(header) else uuid.uuid4().hex
+    request_id.set(rid)
+    return rid
+
+
+def scrub(message):
+    for pattern, replacement in SCRUB_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+def redact(key, value):
+    if key in REDACTED_FIELDS and value:
+        return f"<redacted {len(str(value))} chars>"
+    return value
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the request id, endpoint and user of the calling context"""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        record.endpoint = metrics.current_endpoint.get()
+        record.user = current_user.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Passes a `rate` share of DEBUG records; a record's own `sample` extra overrides it"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, "sample", self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with user content redacted"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": scrub(record.getMessage())
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS and value is not None:
+                entry[key] = redact(key, value)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class BackgroundHandler(QueueHandler):
+    """QueueHandler whose queue is drained to `target` by a thread in each process.
+
+    Callers only pay for a put_nowait: when the writer falls behind (a slow
+    log pipe) and the queue fills up, records are dropped and counted rather
+    than holding up the request. The drain thread is started on first use
+    so that it exists in every forked worker.
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid != os.getpid():
+                # A queue inherited across a fork may have been mid-put; start clean
+                self.queue = queue.Queue(self.maxsize)
+                self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self.listener.start()
+                self.pid = os.getpid()
+
+    def enqueue(self, record):
+        self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("verifynow_log_records_dropped_total")
+
+    def stop(self):
+        """Write out what is queued; for interpreter exit"""
+        if self.listener is None or self.pid != os.getpid():
+            return
+        try:
+            self.listener.stop()
+        except queue.Full:
+            pass
+
+
+def setup_logging(level="INFO", debug_sample=0.01, maxsize=10000, stream=None):
+    """Send all logging through one BackgroundHandler writing JSON lines to stdout"""
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JSONFormatter())
+
+    handler = BackgroundHandler(target, maxsize)
+    # Filters run in the calling thread, so sampled-out records never reach the queue
+    handler.addFilter(SamplingFilter(debug_sample))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, BackgroundHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    atexit.register(handler.stop)
+    return handler
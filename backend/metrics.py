@@ -0,0 +1,208 @@
+# metrics.py
+import os, json, time, bisect, logging, tempfile, threading, contextvars
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow model calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "verifynow-metrics"))
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+HELP = {
+    "verifynow_request_seconds": "End-to-end request latency per endpoint",
+    "verifynow_stage_seconds": "Latency of each pipeline stage",
+    "verifynow_gemini_seconds": "Latency of each Gemini call per model",
+    "verifynow_gemini_fallbacks_total": "Gemini calls that failed over to the next model",
+    "verifynow_json_parse_failures_total": "Model responses that were not valid verdict JSON",
+    "verifynow_json_repairs_total": "Repair attempts for malformed model JSON by outcome",
+    "verifynow_cache_hits_total": "Cache lookups served without upstream work",
+    "verifynow_cache_misses_total": "Cache lookups that fell through to upstream work",
+    "verifynow_upstream_wait_seconds": "Time spent queued for a fair-share Gemini slot",
+    "verifynow_admission_rejections_total": "Requests turned away by rate limits or a full upstream queue",
+    "verifynow_upstream_throttled_total": "429 responses from upstream APIs, applied to every worker",
+    "verifynow_model_routes_total": "Gemini tier chosen per call, with the reason and request type",
+    "verifynow_hedges_total": "Hedged Gemini calls by which request returned the winning answer",
+    "verifynow_hedges_skipped_total": "Hedges not sent because no Gemini slot was free",
+    "verifynow_domain_index_total": "Link checks by the reputation category of their domain",
+    "verifynow_probe_seconds": "Background dependency probe latency by outcome",
+    "verifynow_log_records_dropped_total": "Log records dropped because the log queue was full",
+    "verifynow_image_provenance_total": "Image checks by what their header metadata settled"
+}
+
+log = logging.getLogger(__name__)
+
+# Per-request state: the endpoint label and the Server-Timing entries
+current_endpoint = contextvars.ContextVar("current_endpoint", default="none")
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_flusher = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Record one latency sample"""
+    key = _key(name, labels)
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        hist[index] += 1
+        hist[-1] += seconds
+    _start_flusher()
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _start_flusher()
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Time a pipeline stage for the histogram and the Server-Timing header"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("verifynow_stage_seconds", elapsed, stage=stage, endpoint=current_endpoint.get(), **labels)
+        timings = current_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def begin_request(endpoint):
+    """Reset per-request state; call at the start of each request or job"""
+    current_endpoint.set(endpoint or "none")
+    current_timings.set({})
+
+
+def server_timing_header(total=None):
+    """Render the stages timed in this request as a Server-Timing value"""
+    timings = current_timings.get() or {}
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def stage_timings_ms():
+    """Stages timed so far in this request or job, in milliseconds"""
+    timings = current_timings.get() or {}
+    return {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+
+
+# -------------------------
+# Cross-worker aggregation
+# -------------------------
+# Each gunicorn worker periodically writes its own snapshot to METRICS_DIR;
+# a scrape merges every worker's file.
+def snapshot():
+    with _lock:
+        return {
+            "histograms": [[name, list(labels), list(values)] for (name, labels), values in _histograms.items()],
+            "counters": [[name, list(labels), value] for (name, labels), value in _counters.items()]
+        }
+
+
+def flush():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            log.warning("Metrics flush failed: %s", e)
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None or _flusher[0] != os.getpid():
+        with _lock:
+            if _flusher is None or _flusher[0] != os.getpid():
+                thread = threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True)
+                thread.start()
+                _flusher = (os.getpid(), thread)
+
+
+def clear_metrics_dir():
+    """Drop snapshots from previous runs; call once from the gunicorn master"""
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if name.startswith("metrics-"):
+                os.remove(os.path.join(METRICS_DIR, name))
+
+
+def collect():
+    """Merge every worker's snapshot into one set of series"""
+    flush()
+    histograms, counters = {}, {}
+    for name in os.listdir(METRICS_DIR):
+        if not (name.startswith("metrics-") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, values in data["histograms"]:
+            key = (metric, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        for metric, labels, value in data["counters"]:
+            key = (metric, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus():
+    """Prometheus text exposition of all workers' metrics"""
+    histograms, counters = collect()
+    lines, described = [], set()
+
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), values in sorted(histograms.items()):
+        describe(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), values[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,347 @@
+# pagefetch.py
+import re, time, json, codecs, socket, logging, threading, ipaddress
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import metrics
+from sqlitedb import connect_sqlite
+
+USER_AGENT = "VerifyNowBot/1.0 (+https://verify-now-ashy.vercel.app)"
+TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+log = logging.getLogger(__name__)
+
+
+class FetchError(Exception):
+    """The page could not be fetched within the limits"""
+
+
+# -------------------------
+# Main-text extraction
+# -------------------------
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "header", "aside", "form", "button", "iframe", "select"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "h1", "h2", "h3", "h4", "blockquote", "pre", "td", "br", "tr", "figcaption"}
+# Containers that usually hold the article itself
+MAIN_TAGS = {"article", "main"}
+
+
+class TextExtractor(HTMLParser):
+    """Single pass over the HTML collecting title and visible block text.
+
+    Text inside <article>/<main> is kept separately and preferred when it
+    holds most of the page's prose; chrome like nav, footers and scripts is
+    dropped entirely.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.meta_title = ""
+        self.description = ""
+        self.blocks, self.main_blocks = [], []
+        self.current = []
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "meta":
+                attrs = dict(attrs)
+                name = (attrs.get("property") or attrs.get("name") or "").lower()
+                if name == "og:title":
+                    self.meta_title = attrs.get("content") or ""
+                elif name in ("description", "og:description") and not self.description:
+                    self.description = attrs.get("content") or ""
+            elif tag == "br":
+                self.flush()
+            return
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in MAIN_TAGS:
+            self.flush()
+            self.main_depth += 1
+        elif tag == "title":
+            self.in_title = True
+        elif tag in BLOCK_TAGS:
+            self.flush()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in MAIN_TAGS:
+            self.flush()
+            self.main_depth = max(0, self.main_depth - 1)
+        elif tag == "title":
+            self.in_title = False
+        elif tag in BLOCK_TAGS:
+            self.flush()
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        elif not self.skip_depth:
+            self.current.append(data)
+
+    def flush(self):
+        text = re.sub(r"\s+", " ", "".join(self.current)).strip()
+        self.current = []
+        if len(text) < 2:
+            return
+        self.blocks.append(text)
+        if self.main_depth:
+            self.main_blocks.append(text)
+
+    def result(self):
+        self.flush()
+        total = sum(len(b) for b in self.blocks)
+        main = sum(len(b) for b in self.main_blocks)
+        blocks = self.main_blocks if main >= total * 0.5 else self.blocks
+        return {
+            "title": (self.meta_title or self.title).strip()[:300],
+            "description": self.description.strip()[:500],
+            # Short fragments are mostly menus, bylines and buttons
+            "text": "\n\n".join(b for b in blocks if len(b) >= 40 or b.endswith((".", "!", "?")))
+        }
+
+
+def extract_main_text(html):
+    parser = TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        log.debug("HTML parse stopped early: %s", e)
+    return parser.result()
+
+
+# -------------------------
+# Page cache
+# -------------------------
+PAGE_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_cache (
+    url TEXT PRIMARY KEY,
+    final_url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    page TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_page_cache_fetched ON page_cache (fetched_at);
+"""
+
+
+class PageFetcher:
+    """Fetches a page's main text with redirect, byte and time limits.
+
+    Extracted pages are cached in SQLite (shared by all workers); within
+    `fresh_for` seconds they are served as-is, and after that they are
+    revalidated with If-None-Match / If-Modified-Since.
+    """
+
+    def __init__(self, cache_path, max_bytes=2 * 1024 * 1024, max_redirects=5, fresh_for=600, ttl=7 * 24 * 3600):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.max_redirects = max_redirects
+        self.fresh_for = fresh_for
+        self.ttl = ttl
+        self.local = threading.local()
+        self.writes = 0
+        self.connection().executescript(PAGE_CACHE_SCHEMA)
+
+    def connection(self):
+        return connect_sqlite(self.cache_path, self.local)
+
+    def session(self):
+        # Pooled keep-alive connections, one session per thread
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            # Environment proxies are ignored: through a proxy the address check would judge the proxy, not the page
+            session.trust_env = False
+            session.mount("http://", PublicOnlyAdapter())
+            session.mount("https://", PublicOnlyAdapter())
+            session.headers.update({"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml;q=0.9,text/plain;q=0.8"})
+        return session
+
+    def cached(self, url):
+        row = self.connection().execute(
+            "SELECT final_url, etag, last_modified, page, fetched_at FROM page_cache WHERE url = ? AND fetched_at > ?",
+            (url, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"final_url": row[0], "etag": row[1], "last_modified": row[2], "page": json.loads(row[3]), "fetched_at": row[4]}
+
+    def store(self, url, final_url, etag, last_modified, page):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_cache (url, final_url, etag, last_modified, page, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, final_url, etag, last_modified, json.dumps(page), time.time())
+            )
+            self.writes += 1
+            if self.writes % 200 == 0:
+                conn.execute("DELETE FROM page_cache WHERE fetched_at <= ?", (time.time() - self.ttl,))
+
+    def fetch(self, url, timeout=8):
+        """{"final_url", "title", "description", "text", "status", "cached", "truncated"} for url"""
+        entry = self.cached(url)
+        if entry and time.time() - entry["fetched_at"] < self.fresh_for:
+            metrics.inc("verifynow_cache_hits_total", cache="page")
+            return dict(entry["page"], cached=True)
+
+        give_up = time.monotonic() + timeout
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        with metrics.timed("page_fetch"):
+            response, final_url = self.open(url, headers, give_up)
+            try:
+                if response.status_code == 304 and entry:
+                    metrics.inc("verifynow_cache_hits_total", cache="page_revalidated")
+                    self.store(url, entry["final_url"], entry["etag"], entry["last_modified"], entry["page"])
+                    return dict(entry["page"], cached=True)
+                metrics.inc("verifynow_cache_misses_total", cache="page")
+                if response.status_code >= 400:
+                    raise FetchError(f"HTTP {response.status_code}")
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if content_type and content_type not in TEXT_TYPES:
+                    raise FetchError(f"Not a text page: {content_type}")
+                body, truncated = self.read(response, give_up)
+            finally:
+                response.close()
+
+        html = body.decode(page_encoding(response, body), errors="replace")
+        with metrics.timed("page_extract"):
+            page = extract_main_text(html) if content_type != "text/plain" else {"title": "", "description": "", "text": html}
+        page.update(final_url=final_url, status=response.status_code, truncated=truncated)
+        # Truncated pages are incomplete, so they are not worth revalidating later
+        if not truncated:
+            self.store(url, final_url, response.headers.get("ETag"), response.headers.get("Last-Modified"), page)
+        return dict(page, cached=False)
+
+    def open(self, url, headers, give_up):
+        """Follow redirects (and shorteners) by hand so every hop is checked"""
+        for _ in range(self.max_redirects + 1):
+            check_public_url(url)
+            remaining = give_up - time.monotonic()
+            if remaining <= 0:
+                raise FetchError("Timed out following redirects")
+            try:
+                response = self.session().get(url, headers=headers, stream=True, allow_redirects=False, timeout=(min(3, remaining), remaining))
+            except requests.RequestException as e:
+                raise FetchError(str(e))
+            if response.status_code not in REDIRECT_CODES:
+                return response, url
+            location = response.headers.get("Location")
+            response.close()
+            if not location:
+                raise FetchError("Redirect without Location")
+            url = urljoin(url, location)
+            # Validators belong to the original URL only
+            headers = {}
+        raise FetchError("Too many redirects")
+
+    def read(self, response, give_up):
+        """Body up to max_bytes, stopping early (truncated) at the byte or time limit"""
+        chunks, size = [], 0
+        try:
+            for chunk in response.iter_content(chunk_size=16384):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes or time.monotonic() >= give_up:
+                    return b"".join(chunks)[:self.max_bytes], True
+        except requests.RequestException as e:
+            if not chunks:
+                raise FetchError(str(e))
+            return b"".join(chunks), True
+        return b"".join(chunks), False
+
+
+def page_encoding(response, body):
+    """Charset from the Content-Type header, then a <meta> tag, then UTF-8.
+
+    requests assumes ISO-8859-1 for any text/* without a charset, which
+    garbles most of today's UTF-8 pages.
+    """
+    if "charset=" in response.headers.get("Content-Type", "").lower() and response.encoding:
+        return response.encoding
+    match = META_CHARSET.search(body[:4096])
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def check_public_url(url):
+    """Refuse non-HTTP schemes; the address itself is checked when connecting"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise FetchError(f"Unsupported URL: {url}")
+
+
+def public_address(hostname, port):
+    """An address for hostname, refusing the name if any address is private or local"""
+    try:
+        infos = socket.getaddrinfo(hostname, port, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise FetchError(f"Cannot resolve {hostname}: {e}")
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0].split("%")[0]).is_global:
+            raise FetchError(f"Refusing to fetch non-public address for {hostname}")
+    return infos[0][4][0]
+
+
+# -------------------------
+# Connections pinned to a checked address
+# -------------------------
+class PublicOnlyConnection:
+    """Connects to the address public_address() just approved, never a fresh lookup.
+
+    Resolving once and connecting to that exact address leaves no gap for a
+    rebinding DNS record (TTL 0) to point the connection at 127.0.0.1 or a
+    metadata service between the check and the connect. TLS still sends
+    and verifies the hostname.
+    """
+
+    def _new_conn(self):
+        hostname = self._dns_host
+        self._dns_host = public_address(hostname, self.port)
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = hostname
+
+
+class PublicOnlyHTTPConnection(PublicOnlyConnection, HTTPConnection):
+    pass
+
+
+class PublicOnlyHTTPSConnection(PublicOnlyConnection, HTTPSConnection):
+    pass
+
+
+class PublicOnlyHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PublicOnlyHTTPConnection
+
+
+class PublicOnlyHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PublicOnlyHTTPSConnection
+
+
+class PublicOnlyAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": PublicOnlyHTTPConnectionPool, "https": PublicOnlyHTTPSConnectionPool}
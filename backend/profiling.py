@@ -0,0 +1,425 @@
+# profiling.py
+import io, os, re, sys, json, time, uuid, marshal, pstats, cProfile, threading, tracemalloc
+from collections import Counter
+from sqlitedb import connect_sqlite
+
+# endpoint -> capture session armed in this worker. Sessions and their results
+# live in SQLite so that every gunicorn worker profiles its share of the
+# requests and any worker can serve the report; each worker re-reads the
+# armed set every POLL_INTERVAL seconds, so that read is the only cost while
+# nothing is armed.
+armed = {}
+
+MAX_SESSIONS = 20
+MAX_SNAPSHOTS = 10
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+POLL_INTERVAL = float(os.getenv("PROFILE_POLL_INTERVAL", 2))
+STATE_PATH = os.getenv("PROFILE_SQLITE_PATH", "profiling.db")
+# tracemalloc snapshots, as files any worker can load and diff
+SNAPSHOT_DIR = os.getenv("PROFILE_SNAPSHOT_DIR", "profile_snapshots")
+
+PROFILING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile_sessions (
+    id TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    remaining INTEGER,
+    until REAL,
+    finished INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profile_sessions_armed ON profile_sessions (finished, endpoint);
+CREATE TABLE IF NOT EXISTS profile_results (
+    session_id TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    captured INTEGER NOT NULL,
+    stats BLOB,
+    stacks TEXT,
+    PRIMARY KEY (session_id, pid)
+);
+"""
+
+_lock = threading.Lock()
+# cProfile hooks the interpreter per thread; only profile one request at a time
+_cprofile_lock = threading.Lock()
+_local = threading.local()
+_schema_pid = None
+_polled = (None, 0.0)
+_sampled_threads = {}
+_sampler = None
+
+
+def _connection():
+    global _schema_pid
+    conn = connect_sqlite(STATE_PATH, _local)
+    if _schema_pid != os.getpid():
+        conn.executescript(PROFILING_SCHEMA)
+        _schema_pid = os.getpid()
+    return conn
+
+
+class CaptureSession:
+    """Profile data this worker collected for one endpoint over N requests or T seconds.
+
+    The request budget is shared: workers take requests from the session
+    row, so `requests` counts across all of them.
+    """
+
+    def __init__(self, endpoint, mode, id=None, until=None):
+        self.id = id or uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.mode = mode
+        self.until = until
+        self.exhausted = False
+        self.captured = 0
+        self.stats = None
+        self.stacks = Counter()
+        self.finished = False
+
+    def expired(self):
+        return self.exhausted or (self.until is not None and time.time() >= self.until)
+
+    def take(self):
+        """Claim one request from the shared budget; False once it is spent"""
+        conn = _connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE profile_sessions SET remaining = remaining - 1 WHERE id = ? AND finished = 0 AND (remaining IS NULL OR remaining > 0)",
+                (self.id,)
+            )
+        if cursor.rowcount == 0:
+            self.exhausted = True
+        return not self.exhausted
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "mode": self.mode,
+            "capturedRequests": self.captured,
+            "finished": self.finished,
+            "pid": os.getpid()
+        }
+
+
+def arm(endpoint, mode="cprofile", requests=None, seconds=None):
+    """Start capturing the next `requests` calls, or `seconds` worth, of an endpoint in every worker"""
+    if mode not in ("cprofile", "sample"):
+        raise ValueError("mode must be cprofile or sample")
+    for name, value, kinds in (("requests", requests, int), ("seconds", seconds, (int, float))):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, kinds) or not value > 0):
+            raise ValueError(f"{name} must be a positive {'integer' if kinds is int else 'number'}")
+    if not requests and not seconds:
+        requests = 10
+    session = CaptureSession(endpoint, mode, until=time.time() + seconds if seconds else None)
+    conn = _connection()
+    with conn:
+        conn.execute("UPDATE profile_sessions SET finished = 1 WHERE endpoint = ? AND finished = 0", (endpoint,))
+        conn.execute(
+            "INSERT INTO profile_sessions (id, endpoint, mode, remaining, until, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (session.id, endpoint, mode, requests, session.until, time.time())
+        )
+        stale = "SELECT id FROM profile_sessions ORDER BY created_at DESC LIMIT -1 OFFSET ?"
+        conn.execute(f"DELETE FROM profile_results WHERE session_id IN ({stale})", (MAX_SESSIONS,))
+        conn.execute(f"DELETE FROM profile_sessions WHERE id IN ({stale})", (MAX_SESSIONS,))
+    with _lock:
+        if endpoint in armed:
+            armed[endpoint].finished = True
+        armed[endpoint] = session
+    return session
+
+
+def disarm(endpoint):
+    """Stop the endpoint's session in every worker; returns the endpoints still armed"""
+    conn = _connection()
+    with conn:
+        conn.execute("UPDATE profile_sessions SET finished = 1 WHERE endpoint = ? AND finished = 0", (endpoint,))
+    with _lock:
+        session = armed.pop(endpoint, None)
+        if session:
+            session.finished = True
+    return [row[0] for row in conn.execute("SELECT endpoint FROM profile_sessions WHERE finished = 0")]
+
+
+def poll():
+    """This worker's armed sessions, re-read from SQLite at most every POLL_INTERVAL seconds"""
+    global _polled
+    now = time.monotonic()
+    if _polled[0] == os.getpid() and now - _polled[1] < POLL_INTERVAL:
+        return armed
+    _polled = (os.getpid(), now)
+    rows = _connection().execute("SELECT id, endpoint, mode, until FROM profile_sessions WHERE finished = 0").fetchall()
+    with _lock:
+        live = {row[1]: row for row in rows}
+        for endpoint, session in list(armed.items()):
+            if endpoint not in live or live[endpoint][0] != session.id:
+                # Disarmed or replaced from another worker
+                armed.pop(endpoint)
+                session.finished = True
+        for session_id, endpoint, mode, until in rows:
+            if endpoint not in armed:
+                armed[endpoint] = CaptureSession(endpoint, mode, session_id, until)
+    return armed
+
+
+def _finish(session):
+    """Called with _lock held once a session is spent"""
+    if armed.get(session.endpoint) is session:
+        armed.pop(session.endpoint)
+    session.finished = True
+    conn = _connection()
+    with conn:
+        conn.execute("UPDATE profile_sessions SET finished = 1 WHERE id = ?", (session.id,))
+
+
+def begin(endpoint):
+    """Request hook; returns a token for end(), or None when not profiling"""
+    with _lock:
+        session = armed.get(endpoint)
+        if session is None:
+            return None
+        if session.expired():
+            _finish(session)
+            return None
+
+    if session.mode == "cprofile":
+        if not _cprofile_lock.acquire(blocking=False):
+            return None
+        # Only spend a request from the budget once it will really be captured
+        if not session.take():
+            _cprofile_lock.release()
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return session, profiler
+
+    if not session.take():
+        return None
+    _sampled_threads[threading.get_ident()] = session
+    _start_sampler()
+    return session, None
+
+
+def end(token):
+    session, profiler = token
+    if profiler is not None:
+        profiler.disable()
+        _cprofile_lock.release()
+        with _lock:
+            if session.stats is None:
+                session.stats = pstats.Stats(profiler)
+            else:
+                session.stats.add(profiler)
+    else:
+        _sampled_threads.pop(threading.get_ident(), None)
+
+    with _lock:
+        session.captured += 1
+        stats = marshal.dumps(session.stats.stats) if session.stats is not None else None
+        stacks = json.dumps(session.stacks)
+        if session.expired():
+            _finish(session)
+    # This worker's totals so far, so a report from any worker includes them
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO profile_results (session_id, pid, captured, stats, stacks) VALUES (?, ?, ?, ?, ?)",
+            (session.id, os.getpid(), session.captured, stats, stacks)
+        )
+
+
+# -------------------------
+# Stack sampler
+# -------------------------
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample_forever():
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        if not _sampled_threads:
+            continue
+        frames = sys._current_frames()
+        for thread_id, session in list(_sampled_threads.items()):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                stack = _collapse(frame)
+                with _lock:
+                    session.stacks[stack] += 1
+
+
+def _start_sampler():
+    global _sampler
+    if _sampler is None or _sampler[0] != os.getpid():
+        with _lock:
+            if _sampler is None or _sampler[0] != os.getpid():
+                thread = threading.Thread(target=_sample_forever, name="stack-sampler", daemon=True)
+                thread.start()
+                _sampler = (os.getpid(), thread)
+
+
+# -------------------------
+# Reports
+# -------------------------
+def report(session_id, fmt="text", limit=50):
+    """Render a session as pstats text, a binary pstats dump or collapsed stacks.
+
+    Merges what every worker captured. Returns (body, mimetype), or None
+    if the session is unknown.
+    """
+    conn = _connection()
+    row = conn.execute("SELECT mode FROM profile_sessions WHERE id = ?", (session_id,)).fetchone()
+    if row is None:
+        return None
+
+    stats, stacks = None, Counter()
+    for dumped, collapsed in conn.execute("SELECT stats, stacks FROM profile_results WHERE session_id = ?", (session_id,)):
+        if dumped:
+            part = pstats.Stats(_DumpedStats(marshal.loads(dumped)))
+            if stats is None:
+                stats = part
+            else:
+                stats.add(part)
+        stacks.update(json.loads(collapsed or "{}"))
+
+    if fmt == "collapsed":
+        if row[0] == "sample":
+            lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        else:
+            lines = _pstats_collapsed(stats)
+        return "\n".join(lines) + "\n", "text/plain"
+
+    if stats is None:
+        return "No cProfile data captured\n", "text/plain"
+
+    if fmt == "pstats":
+        # Binary dump loadable with pstats.Stats(path) or snakeviz
+        return marshal.dumps(stats.stats), "application/octet-stream"
+
+    out = io.StringIO()
+    merged = pstats.Stats(stream=out)
+    merged.add(stats)
+    merged.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue(), "text/plain"
+
+
+class _DumpedStats:
+    """A stored stats dict in the shape pstats.Stats() loads from a Profile"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _pstats_collapsed(stats):
+    # cProfile only keeps caller->callee edges, so this is a one-level approximation
+    if stats is None:
+        return []
+    lines = []
+    for (filename, line, name), (_, _, _, _, callers) in stats.stats.items():
+        callee = f"{name} ({os.path.basename(filename)}:{line})"
+        for (c_file, c_line, c_name), caller_stats in callers.items():
+            micros = int(caller_stats[2] * 1e6)
+            if micros:
+                lines.append(f"{c_name} ({os.path.basename(c_file)}:{c_line});{callee} {micros}")
+    return lines
+
+
+# -------------------------
+# tracemalloc
+# -------------------------
+# Tracing is a property of one process, so start/stop/status act on the worker
+# that serves the call (its pid is in every status). Snapshots are written to
+# SNAPSHOT_DIR and can be listed and diffed from any worker.
+SNAPSHOT_ID = re.compile(r"[0-9a-f]{12}")
+
+
+def _snapshot_path(snapshot_id):
+    return os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.snapshot")
+
+
+def _snapshot_ids():
+    """Stored snapshot ids, oldest first"""
+    try:
+        names = [name[:-len(".snapshot")] for name in os.listdir(SNAPSHOT_DIR) if name.endswith(".snapshot")]
+    except FileNotFoundError:
+        return []
+    return sorted((name for name in names if SNAPSHOT_ID.fullmatch(name)), key=lambda name: os.path.getmtime(_snapshot_path(name)))
+
+
+def _load_snapshot(snapshot_id):
+    if not snapshot_id or not SNAPSHOT_ID.fullmatch(snapshot_id):
+        return None
+    try:
+        return tracemalloc.Snapshot.load(_snapshot_path(snapshot_id))
+    except FileNotFoundError:
+        return None
+
+
+def tracemalloc_start(frames=10):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return tracemalloc_status()
+
+
+def tracemalloc_stop():
+    tracemalloc.stop()
+    return tracemalloc_status()
+
+
+def tracemalloc_status():
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "currentBytes": current,
+        "peakBytes": peak,
+        "snapshots": _snapshot_ids(),
+        "pid": os.getpid()
+    }
+
+
+def _format_stats(stats, limit):
+    return [
+        {
+            "location": str(stat.traceback),
+            "sizeBytes": stat.size,
+            "sizeDiffBytes": getattr(stat, "size_diff", None),
+            "count": stat.count,
+            "countDiff": getattr(stat, "count_diff", None)
+        }
+        for stat in stats[:limit]
+    ]
+
+
+def take_snapshot(limit=20):
+    """Store a snapshot and return its largest allocation sites"""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    snapshot_id = uuid.uuid4().hex[:12]
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    snapshot.dump(_snapshot_path(snapshot_id))
+    for stale in _snapshot_ids()[:-MAX_SNAPSHOTS]:
+        try:
+            os.remove(_snapshot_path(stale))
+        except FileNotFoundError:
+            pass
+    return {"id": snapshot_id, "top": _format_stats(snapshot.statistics("lineno"), limit)}
+
+
+def diff_snapshots(from_id, to_id, limit=20):
+    old, new = _load_snapshot(from_id), _load_snapshot(to_id)
+    if old is None or new is None:
+        return None
+    return _format_stats(new.compare_to(old, "lineno"), limit)
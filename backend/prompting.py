@@ -0,0 +1,147 @@
+# prompting.py
+import re
+
+VERDICT_SCHEMA = '{"verdict":"Real"|"Fake"|"Misleading"|"Unverified","summary":"Brief analysis...","proofs":["Evidence 1","Evidence 2"],"confidence":85}'
+
+# Lines that carry no claims: site chrome, share widgets, cookie banners
+BOILERPLATE = re.compile(
+    r"^\s*(advertisement|sponsored( content)?|share( this( article| story)?)?|tweet|subscribe\b.*|sign up\b.*|"
+    r"read more\b.*|related( articles| stories)?:?|click here\b.*|accept( all)? cookies\b.*|"
+    r"we use cookies\b.*|follow us\b.*|(image|photo)( credit)?:.*|copyright\b.*|©.*|all rights reserved\.?)\s*$",
+    re.IGNORECASE
+)
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'“])")
+CLAIM_SIGNAL = re.compile(r"\d|%|\b(is|are|was|were|has|have|will|causes?|cures?|killed|died|said|claims?|according)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate, close to Gemini's count for English prose"""
+    return max(len(TOKEN_PATTERN.findall(text)), len(text) // 4)
+
+
+def compact_text(text):
+    """Drop boilerplate and repeated lines and squeeze whitespace.
+
+    Boilerplate is only dropped from multi-line input: a one-line claim that
+    happens to start like site chrome ("Click here to claim...") is the
+    content itself. Never returns empty for non-blank input.
+    """
+    raw_lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in text.splitlines()]
+    strip_boilerplate = sum(1 for line in raw_lines if line) > 1
+    seen, lines = set(), []
+    for line in raw_lines:
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        if (strip_boilerplate and BOILERPLATE.match(line)) or line.lower() in seen:
+            continue
+        seen.add(line.lower())
+        lines.append(line)
+    compacted = "\n".join(lines).strip()
+    # Everything looked like chrome: better to check all of it than nothing
+    return compacted or "\n".join(line for line in raw_lines if line)
+
+
+def truncate_to_budget(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Scale by the observed chars-per-token ratio, then trim to a word boundary
+    keep = int(len(text) * max_tokens / estimate_tokens(text))
+    return text[:keep].rsplit(" ", 1)[0] + " …"
+
+
+def chunk_text(text, max_tokens):
+    """Split on paragraph, then sentence, boundaries into chunks under max_tokens"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(truncate_to_budget(s, max_tokens) for s in SENTENCE_END.split(paragraph))
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and size + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def select_chunks(chunks, max_chunks):
+    """Keep the most claim-dense chunks, in document order, when there are too many"""
+    if len(chunks) <= max_chunks:
+        return chunks
+    density = lambda chunk: len(CLAIM_SIGNAL.findall(chunk)) / max(estimate_tokens(chunk), 1)
+    ranked = sorted(range(len(chunks)), key=lambda i: density(chunks[i]), reverse=True)[:max_chunks]
+    return [chunks[i] for i in sorted(ranked)]
+
+
+def build_prompt(label, content, schema=VERDICT_SCHEMA, context=""):
+    """The fact-checking prompt every pipeline sends, for one piece of content"""
+    return f"""
+You are a fact-checking assistant. Analyze this {label.lower()} and respond ONLY with valid JSON:
+{schema}
+{context}
+{label}: "{content}"
+"""
+
+
+# -------------------------
+# Merging chunk verdicts
+# -------------------------
+def merge_verdicts(results, unit="sections"):
+    """Combine per-section or per-claim results into one verdict, proofs list and confidence.
+
+    A confident Fake anywhere makes the whole text Fake; false and true parts
+    together make it Misleading; otherwise the confidence-weighted majority wins.
+    """
+    scored = [r for r in results if r.get("verdict") and r.get("verdict") != "Unverified"]
+    if not scored:
+        verdict = "Unverified"
+    else:
+        weights = {}
+        for r in scored:
+            weights[r["verdict"]] = weights.get(r["verdict"], 0) + confidence_of(r)
+        has_true = "Real" in weights
+        has_false = "Fake" in weights or "Misleading" in weights
+        if any(r["verdict"] == "Fake" and confidence_of(r) >= 70 for r in scored) and not has_true:
+            verdict = "Fake"
+        elif has_true and has_false:
+            verdict = "Misleading"
+        else:
+            verdict = max(weights, key=weights.get)
+
+    agreeing = [r for r in results if r.get("verdict") == verdict] or results
+    confidence = round(sum(confidence_of(r) for r in agreeing) / max(len(agreeing), 1))
+
+    proofs, seen = [], set()
+    for r in sorted(results, key=confidence_of, reverse=True):
+        for proof in r.get("proofs") or []:
+            if isinstance(proof, str) and proof.lower() not in seen:
+                seen.add(proof.lower())
+                proofs.append(proof)
+
+    summaries = [r.get("summary") for r in agreeing if r.get("summary")]
+    summary = f"Checked {len(results)} {unit} of the text. " + " ".join(summaries[:3])
+
+    return {
+        "verdict": verdict,
+        "summary": summary.strip(),
+        "proofs": proofs[:8] or ["Content analyzed"],
+        "confidence": confidence,
+        "sections": [{"verdict": r.get("verdict"), "confidence": r.get("confidence")} for r in results]
+    }
+
+
+def confidence_of(result):
+    try:
+        return min(max(float(result.get("confidence") or 0), 0), 100)
+    except (TypeError, ValueError):
+        return 0
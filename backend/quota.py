@@ -0,0 +1,170 @@
+# quota.py
+import re, json, time, threading
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from sqlitedb import connect_sqlite
+
+QUOTA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upstream_quota (
+    key TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+# Used when an upstream says 429 without a hint
+DEFAULT_BACKOFF = 30
+RETRY_HINT = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+
+class QuotaExhausted(Exception):
+    """The upstream is out of quota for longer than the caller is willing to wait"""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f"{key} quota exhausted, retry in {retry_after:.1f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+def quota_key(upstream, model=None):
+    # "models/x" and "x" are the same model and share one quota
+    return f"{upstream}:{model.split('/')[-1]}" if model else upstream
+
+
+def retry_after_header(value):
+    """Seconds from a Retry-After header in either delta-seconds or HTTP-date form, or None"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(when.timestamp() - time.time(), 0)
+
+
+def retry_after_hint(error):
+    """Seconds an upstream asked us to back off, from headers, RetryInfo or the message"""
+    response = getattr(error, "response", None)
+    header = retry_after_header(getattr(response, "headers", {}).get("Retry-After") if response is not None else None)
+    if header is not None:
+        return header
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    match = RETRY_HINT.search(str(error))
+    return float(match.group(1)) if match else DEFAULT_BACKOFF
+
+
+class QuotaGovernor:
+    """Requests- and tokens-per-minute budgets per upstream and model, shared by all workers.
+
+    Limits come as {"gemini:model-name": {"rpm": 5, "tpm": 250000}}; keys without
+    limits are only held back by 429 hints. Budgets are token buckets refilled
+    continuously at `headroom` of the published limit, so bursts stay just under it.
+    """
+
+    def __init__(self, path, limits=None, headroom=0.9):
+        self.path = path
+        self.limits = limits or {}
+        self.headroom = headroom
+        self.local = threading.local()
+        self.connection().executescript(QUOTA_SCHEMA)
+
+    def connection(self):
+        return connect_sqlite(self.path, self.local, isolation_level=None)
+
+    def budget(self, key):
+        limit = self.limits.get(key) or {}
+        rpm, tpm = limit.get("rpm"), limit.get("tpm")
+        return (rpm * self.headroom if rpm else None), (tpm * self.headroom if tpm else None)
+
+    def reserve(self, key, tokens=0):
+        """Take one request and `tokens` from the budget if available; returns seconds to wait (0 = granted)"""
+        rpm, tpm = self.budget(key)
+        now = time.time()
+        conn = self.connection()
+        if not rpm and not tpm:
+            # Nothing to spend, so only a 429 hint can hold the call; a plain read needs no write lock
+            row = conn.execute("SELECT blocked_until FROM upstream_quota WHERE key = ?", (key,)).fetchone()
+            return max(0, row[0] - now) if row else 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at, blocked_until FROM upstream_quota WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                available_requests, available_tokens, blocked_until = rpm or 0, tpm or 0, 0
+            else:
+                elapsed = now - row[2]
+                available_requests = min(rpm, row[0] + elapsed * rpm / 60) if rpm else 0
+                available_tokens = min(tpm, row[1] + elapsed * tpm / 60) if tpm else 0
+                blocked_until = row[3]
+
+            # A request larger than the whole minute's budget still goes once the bucket is full
+            tokens = min(tokens, tpm) if tpm else 0
+            wait = max(0, blocked_until - now)
+            if rpm and available_requests < 1:
+                wait = max(wait, (1 - available_requests) * 60 / rpm)
+            if tpm and available_tokens < tokens:
+                wait = max(wait, (tokens - available_tokens) * 60 / tpm)
+            if wait == 0:
+                available_requests -= 1 if rpm else 0
+                available_tokens -= tokens
+
+            conn.execute(
+                "INSERT OR REPLACE INTO upstream_quota (key, requests, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?, ?)",
+                (key, available_requests, available_tokens, now, blocked_until)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, key, tokens=0, max_wait=10):
+        """Block until the call fits the budget, or raise QuotaExhausted if that takes over max_wait"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.reserve(key, tokens)
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise QuotaExhausted(key, wait)
+            time.sleep(wait)
+
+    def settle(self, key, reserved, used):
+        """Charge the difference once the real token count is known"""
+        if not self.budget(key)[1] or used is None or used == reserved:
+            return
+        conn = self.connection()
+        with conn:
+            conn.execute("UPDATE upstream_quota SET tokens = tokens - ? WHERE key = ?", (used - reserved, key))
+
+    def penalize(self, key, retry_after):
+        """Hold every worker back from `key` after the upstream answered 429"""
+        until = time.time() + retry_after
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO upstream_quota (key, requests, tokens, updated_at, blocked_until) VALUES (?, 0, 0, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                (key, time.time(), until)
+            )
+
+
+def load_limits(raw):
+    """Parse the UPSTREAM_QUOTAS JSON, normalizing model names like quota_key does"""
+    limits = {}
+    for key, limit in (json.loads(raw) if raw else {}).items():
+        upstream, _, model = key.partition(":")
+        limits[quota_key(upstream, model or None)] = limit
+    return limits
@@ -0,0 +1,118 @@
+# responses.py
+import gzip
+from flask.json.provider import DefaultJSONProvider
+import metrics
+
+# Both are optional: without them responses fall back to the stdlib encoder and gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/plain", "text/csv", "text/html")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed.
+
+    jsonify() output matches the stdlib provider except that keys keep their
+    insertion order instead of being sorted. Dates and other types orjson
+    would format differently still go through Flask's default().
+    """
+
+    sort_keys = False
+
+    def options(self, pretty=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options()).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        # Straight to bytes; no str round trip
+        body = orjson.dumps(obj, default=self.default, option=self.options(pretty))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def compress_response(response, accept_encodings, min_size=1024, gzip_level=6, brotli_quality=5):
+    """Compress a buffered response in place with the client's preferred encoding.
+
+    Streamed bodies (SSE, exports) and already-encoded responses are left
+    alone, as is anything under min_size, where the headers would eat the saving.
+    """
+    if (
+        response.is_streamed
+        or response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    encoding = accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+    if encoding is None:
+        return response
+
+    with metrics.timed("compress", encoding=encoding):
+        if encoding == "br":
+            body = brotli.compress(data, quality=brotli_quality)
+        else:
+            body = gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def parse_fields(value):
+    """"verdict,summary,safety_check.safe" -> {"verdict": None, ..., "safety_check": {"safe": None}}
+
+    None as a leaf keeps the whole value; None overall means no trimming.
+    """
+    selection = {}
+    for path in (value or "").split(","):
+        parts = [part.strip() for part in path.split(".") if part.strip()]
+        node = selection
+        for depth, part in enumerate(parts):
+            if depth == len(parts) - 1:
+                node[part] = None
+                break
+            child = node.get(part, {})
+            if child is None:
+                # The whole field is already selected
+                break
+            node[part] = child
+            node = child
+    return selection or None
+
+
+def select_fields(obj, selection):
+    """Keep only the selected keys of a result object, or of each item of a list"""
+    if selection is None:
+        return obj
+    if isinstance(obj, list):
+        return [select_fields(item, selection) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    return {key: select_fields(obj[key], sub) for key, sub in selection.items() if key in obj}
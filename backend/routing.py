@@ -0,0 +1,51 @@
+# routing.py
+import os, contextvars
+import metrics
+
+MODEL_TIERS = {
+    "pro": ["models/gemini-2.5-pro-preview-03-25", "gemini-2.5-pro-preview-03-25"],
+    "flash": ["models/gemini-2.5-flash-preview-05-20", "gemini-2.5-flash-preview-05-20"]
+}
+
+# Prompt tokens (the ~80-token template included) at or under which flash is enough
+SHORT_PROMPT_TOKENS = int(os.getenv("ROUTING_SHORT_PROMPT_TOKENS", 200))
+# Client budgets under this many seconds cannot wait for pro
+FAST_LATENCY_BUDGET = float(os.getenv("ROUTING_FAST_LATENCY_BUDGET", 8))
+# Busy and queued Gemini calls per slot at which everything shifts to flash
+HIGH_LOAD = float(os.getenv("ROUTING_HIGH_LOAD", 1.0))
+# Request types whose prompts need no deep reasoning
+FLASH_KINDS = {"link"}
+
+# Set per request or job; read when a Gemini call is routed
+request_kind = contextvars.ContextVar("request_kind", default="text")
+latency_budget = contextvars.ContextVar("latency_budget", default=None)
+
+
+def choose_tier(kind, prompt_tokens, budget=None, load=0.0):
+    """(tier, reason) for one Gemini call"""
+    if budget is not None and budget < FAST_LATENCY_BUDGET:
+        return "flash", "latency_budget"
+    if load >= HIGH_LOAD:
+        return "flash", "load"
+    if kind in FLASH_KINDS:
+        return "flash", "request_type"
+    if prompt_tokens <= SHORT_PROMPT_TOKENS:
+        return "flash", "short_input"
+    return "pro", "complex_input"
+
+
+def route_models(prompt_tokens, load=0.0):
+    """Fallback chain for a call: the chosen tier first, the other tier behind it"""
+    kind = request_kind.get()
+    tier, reason = choose_tier(kind, prompt_tokens, latency_budget.get(), load)
+    metrics.inc("verifynow_model_routes_total", tier=tier, reason=reason, kind=kind)
+    other = "pro" if tier == "flash" else "flash"
+    return MODEL_TIERS[tier] + MODEL_TIERS[other]
+
+
+def parse_latency_budget(value):
+    """Seconds from an X-Latency-Budget-Ms header, or None if absent or invalid"""
+    try:
+        return max(float(value), 0) / 1000 if value else None
+    except ValueError:
+        return None
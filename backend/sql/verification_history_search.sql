@@ -0,0 +1,45 @@
+-- Full-text search for verification_history (Supabase / Postgres)
+-- Run once in the Supabase SQL editor. Used by SupabaseHistoryStore.search().
+
+alter table verification_history
+    add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('english', coalesce(summary, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(proofs::text, '')), 'C')
+    ) stored;
+
+create index if not exists idx_verification_history_search
+    on verification_history using gin (search_vector);
+
+create index if not exists idx_verification_history_user_created
+    on verification_history (user_id, created_at desc);
+
+create or replace function search_verification_history(
+    p_user_id text,
+    p_query text,
+    p_limit int default 20,
+    p_offset int default 0
+)
+returns table (
+    id bigint,
+    type text,
+    content text,
+    verdict text,
+    summary text,
+    confidence int,
+    created_at timestamptz,
+    rank real,
+    snippet text
+)
+language sql stable
+as $$
+    select h.id, h.type, h.content, h.verdict, h.summary, h.confidence, h.created_at,
+           ts_rank_cd(h.search_vector, q) as rank,
+           ts_headline('english', coalesce(h.summary, '') || ' ' || coalesce(h.content, ''), q,
+                       'StartSel=[, StopSel=], MaxWords=24, MinWords=8') as snippet
+    from verification_history h, websearch_to_tsquery('english', p_query) q
+    where h.user_id = p_user_id and h.search_vector @@ q
+    order by rank desc, h.created_at desc
+    limit p_limit offset p_offset
+$$;
@@ -0,0 +1,84 @@
+-- Materialized counters for /api/verification-stats (Supabase / Postgres)
+-- Run once in the Supabase SQL editor. Used by SupabaseHistoryStore.stats().
+-- Scope is the row's user_id, or '*' for the global counters.
+
+create table if not exists verification_stats_totals (
+    scope text not null,
+    type text not null,
+    verdict text not null,
+    count bigint not null default 0,
+    confidence_sum bigint not null default 0,
+    primary key (scope, type, verdict)
+);
+
+create table if not exists verification_stats_daily (
+    scope text not null,
+    day date not null,
+    type text not null,
+    verdict text not null,
+    count bigint not null default 0,
+    primary key (scope, day, type, verdict)
+);
+
+create table if not exists verification_stats_confidence (
+    scope text not null,
+    bucket int not null,
+    count bigint not null default 0,
+    primary key (scope, bucket)
+);
+
+create or replace function bump_verification_stats()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_scope text;
+    v_type text := coalesce(new.type, '');
+    v_verdict text := coalesce(new.verdict, 'Unverified');
+    v_confidence int := least(greatest(coalesce(new.confidence, 0)::int, 0), 100);
+begin
+    foreach v_scope in array array[new.user_id::text, '*'] loop
+        insert into verification_stats_totals (scope, type, verdict, count, confidence_sum)
+        values (v_scope, v_type, v_verdict, 1, v_confidence)
+        on conflict (scope, type, verdict) do update
+            set count = verification_stats_totals.count + 1,
+                confidence_sum = verification_stats_totals.confidence_sum + excluded.confidence_sum;
+
+        insert into verification_stats_daily (scope, day, type, verdict, count)
+        values (v_scope, (new.created_at at time zone 'utc')::date, v_type, v_verdict, 1)
+        on conflict (scope, day, type, verdict) do update
+            set count = verification_stats_daily.count + 1;
+
+        insert into verification_stats_confidence (scope, bucket, count)
+        values (v_scope, v_confidence / 10, 1)
+        on conflict (scope, bucket) do update
+            set count = verification_stats_confidence.count + 1;
+    end loop;
+    return new;
+end;
+$$;
+
+drop trigger if exists verification_history_stats on verification_history;
+create trigger verification_history_stats
+    after insert on verification_history
+    for each row execute function bump_verification_stats();
+
+-- One-off backfill of rows saved before the trigger existed
+lock table verification_history in share row exclusive mode;
+truncate verification_stats_totals, verification_stats_daily, verification_stats_confidence;
+
+insert into verification_stats_totals (scope, type, verdict, count, confidence_sum)
+select s.scope, coalesce(h.type, ''), coalesce(h.verdict, 'Unverified'), count(*),
+       sum(least(greatest(coalesce(h.confidence, 0)::int, 0), 100))
+from verification_history h, lateral (values (h.user_id::text), ('*')) s(scope)
+group by 1, 2, 3;
+
+insert into verification_stats_daily (scope, day, type, verdict, count)
+select s.scope, (h.created_at at time zone 'utc')::date, coalesce(h.type, ''), coalesce(h.verdict, 'Unverified'), count(*)
+from verification_history h, lateral (values (h.user_id::text), ('*')) s(scope)
+group by 1, 2, 3, 4;
+
+insert into verification_stats_confidence (scope, bucket, count)
+select s.scope, least(greatest(coalesce(h.confidence, 0)::int, 0), 100) / 10, count(*)
+from verification_history h, lateral (values (h.user_id::text), ('*')) s(scope)
+group by 1, 2;
@@ -0,0 +1,22 @@
+# sqlitedb.py
+import os, sqlite3
+
+
+def connect_sqlite(path, local, row_factory=None, **options):
+    """This thread's connection to `path`, opened on first use and cached on `local`.
+
+    sqlite3 connections must not be shared between threads, so each store
+    keeps one per thread in a threading.local. Every connection runs in WAL
+    mode with synchronous=NORMAL so workers can read while one writes.
+    `options` go to sqlite3.connect (e.g. isolation_level, cached_statements).
+    """
+    conn = getattr(local, "conn", None)
+    # Never reuse a connection inherited across a fork (gunicorn --preload)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, **options)
+        if row_factory is not None:
+            conn.row_factory = row_factory
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn, local.pid = conn, os.getpid()
+    return conn
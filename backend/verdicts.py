@@ -0,0 +1,118 @@
+# verdicts.py
+import re, json
+
+VERDICTS = ("Real", "Fake", "Misleading", "Unverified")
+
+# Response schema handed to Gemini so it emits this JSON object directly
+VERDICT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "verdict": {"type": "STRING", "enum": list(VERDICTS)},
+        "summary": {"type": "STRING"},
+        "proofs": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "confidence": {"type": "INTEGER"},
+        "safety_status": {"type": "STRING"}
+    },
+    "required": ["verdict", "summary", "proofs", "confidence"]
+}
+
+VERDICT_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": VERDICT_RESPONSE_SCHEMA
+}
+
+VERDICT_ALIASES = {
+    "real": "Real", "true": "Real", "verified": "Real", "accurate": "Real", "correct": "Real",
+    "fake": "Fake", "false": "Fake", "incorrect": "Fake", "hoax": "Fake", "fabricated": "Fake",
+    "misleading": "Misleading", "partially true": "Misleading", "partly true": "Misleading",
+    "half true": "Misleading", "mixed": "Misleading", "possibly misleading": "Misleading",
+    "unverified": "Unverified", "unknown": "Unverified", "unproven": "Unverified", "uncertain": "Unverified"
+}
+
+FENCED_JSON = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def parse_verdict(text):
+    """Parse model output into a dict, or None if it holds no JSON object"""
+    if not text:
+        return None
+    candidates = [text.strip()] + [block.strip() for block in FENCED_JSON.findall(text)]
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            pass
+
+    # First complete object anywhere in the text; unlike a greedy regex this
+    # stops at the object's own closing brace
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"\{", text):
+        try:
+            parsed, _ = decoder.raw_decode(text, match.start())
+            if isinstance(parsed, dict):
+                return parsed
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_verdict(parsed, summary="Analysis completed", proofs=None, confidence=75):
+    """Coerce a parsed model answer into the verdict/summary/proofs/confidence contract.
+
+    Unknown keys are kept so endpoint-specific fields (e.g. safety_status) survive.
+    """
+    result = dict(parsed or {})
+
+    verdict = str(result.get("verdict") or "").strip()
+    result["verdict"] = VERDICT_ALIASES.get(verdict.lower(), "Unverified")
+
+    result["summary"] = str(result.get("summary") or "").strip() or summary
+
+    raw_proofs = result.get("proofs")
+    if isinstance(raw_proofs, str):
+        raw_proofs = [raw_proofs]
+    cleaned = [str(p).strip() for p in (raw_proofs or []) if str(p).strip()] if isinstance(raw_proofs, list) else []
+    result["proofs"] = cleaned or list(proofs or ["Content analyzed"])
+
+    value = result.get("confidence")
+    if isinstance(value, str):
+        digits = re.search(r"\d+(\.\d+)?", value)
+        value = float(digits.group()) if digits else None
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        # Some answers use a 0-1 scale; a whole 1 is read as 1%, not 100%
+        value = value * 100 if value < 1 else value
+        result["confidence"] = int(round(min(value, 100)))
+    else:
+        result["confidence"] = confidence
+    return result
+
+
+def repair_prompt(raw):
+    """Cheap follow-up asking a small model to reformat a malformed answer"""
+    return (
+        "Rewrite the following fact-check answer as one JSON object with keys "
+        "verdict (Real, Fake, Misleading or Unverified), summary, proofs (list of strings) "
+        "and confidence (0-100). Do not add new facts.\n\n" + raw[:4000]
+    )
+
+
+def unparsed_verdict(raw):
+    """Last resort when neither the answer nor its repair parsed"""
+    return {
+        "verdict": "Unverified",
+        "summary": raw[:300] + "..." if len(raw) > 300 else raw,
+        "proofs": ["Analysis completed"]
+    }
+
+
+def timed_out_verdict(summary):
+    """Stand-in when the request's deadline ran out before a model answered"""
+    return {
+        "verdict": "Unverified",
+        "summary": summary,
+        "proofs": ["Analysis did not finish in time"],
+        "confidence": 0,
+        "partial": True
+    }